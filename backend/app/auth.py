@@ -1,11 +1,15 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from . import models, schemas, database
+from .passwords import pwd_context, verify_password, get_password_hash, verify_and_update, hash_password
 
 import os
 
@@ -13,17 +17,95 @@ import os
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkeychangeinproduction")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Validated tokens remembered so authenticated requests skip the users query
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+# Longest a cached token is trusted before the user is looked up again (seconds)
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 router = APIRouter()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+class Principal:
+    """The authenticated user as seen by endpoints: just the columns they need."""
+
+    __slots__ = ("id", "username")
+
+    def __init__(self, id: int, username: str):
+        self.id = id
+        self.username = username
+
+
+class TokenCache:
+    """
+    Bounded LRU of token -> Principal.
+
+    An entry lives for AUTH_CACHE_TTL seconds or until the token expires, whichever
+    is sooner. `invalidate_user` drops every token of a user; it is called when the
+    password changes and (through the mapper event below) when the user is deleted.
+    Other workers only notice through the TTL.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, ttl: int = AUTH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[token]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(token)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, token: str, principal: Principal, token_expires: Optional[int]):
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl
+        if token_expires is not None:
+            ttl = min(ttl, token_expires - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, principal)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [token for token, (_, principal) in self._entries.items() if principal.id == user_id]
+            for token in stale:
+                del self._entries[token]
+            self.stats["invalidations"] += len(stale)
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache()
+
+
+@event.listens_for(models.User, "after_delete")
+def _forget_deleted_user(mapper, connection, target):
+    # Bulk query.delete() bypasses this; those rely on the TTL
+    token_cache.invalidate_user(target.id)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -41,6 +123,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -52,17 +137,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     user = db.query(models.User).filter(models.User.username == token_data.username).first()
     if user is None:
         raise credentials_exception
+    principal = Principal(user.id, user.username)
+    token_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+def load_user(principal: Principal, db: Session) -> models.User:
+    """The full User row, for the endpoints that need more than the principal."""
+    user = db.get(models.User, principal.id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
     return user
 
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS
+        user.hashed_password = new_hash
+        db.commit()
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -85,17 +186,19 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)
     return db_user
 
 @router.get("/users/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
-    return current_user
+async def read_users_me(current_user: Principal = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    return load_user(current_user, db)
 
 @router.put("/users/me/password")
 async def change_password(
     password_data: schemas.UserPasswordUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(database.get_db)
 ):
+    user = load_user(current_user, db)
     # 1. Verify old password
-    if not verify_password(password_data.old_password, current_user.hashed_password):
+    valid, _ = await verify_and_update(password_data.old_password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect old password"
@@ -109,8 +212,9 @@ async def change_password(
         )
 
     # 3. Hash and Save
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.add(current_user)
+    user.hashed_password = await hash_password(password_data.new_password)
+    db.add(user)
     db.commit()
+    token_cache.invalidate_user(user.id)
     
     return {"message": "Password updated successfully"}
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import secrets
+from typing import Dict, List, Optional
+
+from .websockets import ConnectionManager, manager
+from .tally import TallyCache, tally_cache
+from .snapshots import poll_snapshots
+
+logger = logging.getLogger(__name__)
+
+# "local" keeps broadcasts inside this process (single worker).
+# "redis" also publishes them to a per-slug Redis channel so every worker can reach its own sockets.
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CHANNEL_PREFIX = "poll:"
+
+# Identifies this process so it can skip its own messages when they come back from Redis
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(2)}"
+
+
+class LocalBackplane:
+    """Default mode: flushed frames go straight to this process's sockets."""
+
+    def __init__(self, manager: ConnectionManager):
+        self.manager = manager
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, message: dict, slug: str):
+        await self.manager.broadcast(message, slug)
+
+
+class RedisBackplane:
+    """
+    Multi-worker mode.
+
+    Frames are delivered to local sockets immediately and published to `poll:<slug>`.
+    Every worker listens on `poll:*` and forwards frames from other workers to its own
+    sockets. Tally frames are re-applied to the local tally first, so the counts and
+    version sequence each client sees stay consistent with the worker it is connected to.
+
+    `client` is a `redis.asyncio.Redis` (or anything with the same `publish`/`pubsub`
+    interface, such as `MemoryRedis` below). `tally` is the worker's TallyCache; several
+    backplanes in one process (tests) each need their own.
+    """
+
+    def __init__(self, manager: ConnectionManager, client, worker_id: str = WORKER_ID, tally: TallyCache = tally_cache):
+        self.manager = manager
+        self.client = client
+        self.tally = tally
+        self.worker_id = worker_id
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self.stats = {"published": 0, "received": 0, "publish_errors": 0}
+
+    async def start(self):
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.psubscribe(CHANNEL_PREFIX + "*")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.punsubscribe()
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    async def publish(self, message: dict, slug: str):
+        await self.manager.broadcast(message, slug)
+        envelope = json.dumps({"origin": self.worker_id, "frame": message})
+        try:
+            await self.client.publish(CHANNEL_PREFIX + slug, envelope)
+            self.stats["published"] += 1
+        except Exception:
+            self.stats["publish_errors"] += 1
+            logger.exception("Publishing to Redis failed for %s", slug)
+
+    async def _listen(self):
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "pmessage":
+                        continue
+                    await self._handle(item["channel"], item["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis backplane listener failed, retrying")
+                await asyncio.sleep(1)
+
+    async def _handle(self, channel, data):
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        envelope = json.loads(data)
+        if envelope.get("origin") == self.worker_id:
+            return
+        self.stats["received"] += 1
+        slug = channel[len(CHANNEL_PREFIX):]
+        frame = envelope["frame"]
+        # Every frame means the poll changed on another worker
+        poll_snapshots.bump(slug)
+        if frame.get("event") == "tally":
+            local = self.tally.apply_remote(slug, frame)
+            if local is None:
+                # No usable tally here; have clients fetch a fresh snapshot
+                local = {"event": "update", "poll_id": frame.get("poll_id")}
+            await self.manager.broadcast(local, slug)
+        else:
+            # Structural change made on another worker
+            self.tally.invalidate(slug)
+            await self.manager.broadcast(frame, slug)
+
+
+class MemoryRedis:
+    """
+    In-process stand-in for the slice of redis.asyncio used by RedisBackplane.
+    Instances created with the same `broker` dict see each other's messages,
+    which is enough to run several backplanes (one per simulated worker) in a test.
+    """
+
+    def __init__(self, broker: Optional[Dict[str, List[asyncio.Queue]]] = None):
+        # pattern -> subscriber queues
+        self.broker = broker if broker is not None else {}
+
+    async def publish(self, channel: str, data: str) -> int:
+        delivered = 0
+        for pattern, queues in self.broker.items():
+            if _pattern_matches(pattern, channel):
+                for queue in queues:
+                    queue.put_nowait({"type": "pmessage", "pattern": pattern, "channel": channel, "data": data})
+                    delivered += 1
+        return delivered
+
+    def pubsub(self):
+        return _MemoryPubSub(self.broker)
+
+
+class _MemoryPubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.patterns: List[str] = []
+
+    async def psubscribe(self, *patterns):
+        for pattern in patterns:
+            self.broker.setdefault(pattern, []).append(self.queue)
+            self.patterns.append(pattern)
+
+    async def punsubscribe(self, *patterns):
+        for pattern in patterns or list(self.patterns):
+            if self.queue in self.broker.get(pattern, []):
+                self.broker[pattern].remove(self.queue)
+            if pattern in self.patterns:
+                self.patterns.remove(pattern)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        await self.punsubscribe()
+
+
+def _pattern_matches(pattern: str, channel: str) -> bool:
+    # Only the trailing "*" form used above is supported
+    if pattern.endswith("*"):
+        return channel.startswith(pattern[:-1])
+    return pattern == channel
+
+
+def create_backplane():
+    if BROADCAST_BACKEND == "redis":
+        import redis.asyncio as redis_asyncio
+        client = redis_asyncio.from_url(REDIS_URL, decode_responses=True)
+        return RedisBackplane(manager, client)
+    return LocalBackplane(manager)
+
+
+backplane = create_backplane()
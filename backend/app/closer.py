@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+
+from . import models, database
+from .snapshots import poll_snapshots
+from .websockets import scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # closes_at is stored as naive UTC; request bodies may carry an offset
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class CloseScheduler:
+    """
+    Closes polls at their `closes_at` deadline.
+
+    Upcoming deadlines sit in a min-heap. `_run` sleeps until the earliest one
+    (or until `schedule` reports an earlier one), then closes every poll that is
+    due. Changing or clearing a deadline leaves the old heap entry in place;
+    `_deadlines` holds the current value and stale entries are skipped when popped.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        # slug -> current deadline
+        self._deadlines: Dict[str, datetime] = {}
+        # Endpoints that reschedule run in the threadpool
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"closed": 0, "failed": 0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        for slug, closes_at in await run_in_threadpool(self._load):
+            self.schedule(slug, closes_at)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def schedule(self, slug: str, closes_at: Optional[datetime]):
+        """Set (or with None, clear) the deadline of an open poll."""
+        with self._lock:
+            if closes_at is None:
+                self._deadlines.pop(slug, None)
+                return
+            closes_at = _naive_utc(closes_at)
+            self._deadlines[slug] = closes_at
+            heapq.heappush(self._heap, (closes_at, slug))
+            earliest = self._heap[0][0] == closes_at
+        if earliest and self._loop is not None:
+            # The sleeping task may be waiting for a later deadline
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def cancel(self, slug: str):
+        self.schedule(slug, None)
+
+    def _load(self) -> List[Tuple[str, datetime]]:
+        db = database.SessionLocal()
+        try:
+            return db.query(models.Poll.slug, models.Poll.closes_at).filter(
+                models.Poll.is_active == True, models.Poll.closes_at.isnot(None)
+            ).all()
+        finally:
+            db.close()
+
+    def _next_deadline(self) -> Optional[datetime]:
+        with self._lock:
+            while self._heap:
+                closes_at, slug = self._heap[0]
+                if self._deadlines.get(slug) == closes_at:
+                    return closes_at
+                heapq.heappop(self._heap)
+            return None
+
+    def _pop_due(self, now: datetime) -> List[Tuple[str, datetime]]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                closes_at, slug = heapq.heappop(self._heap)
+                if self._deadlines.get(slug) == closes_at:
+                    del self._deadlines[slug]
+                    due.append((slug, closes_at))
+        return due
+
+    async def _run(self):
+        while True:
+            # Clear before reading the heap so a deadline scheduled meanwhile still wakes us
+            self._wake.clear()
+            deadline = self._next_deadline()
+            timeout = None if deadline is None else max((deadline - datetime.utcnow()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+                continue
+            except asyncio.TimeoutError:
+                pass
+            for slug, closes_at in self._pop_due(datetime.utcnow()):
+                await self._close(slug, closes_at)
+
+    async def _close(self, slug: str, closes_at: datetime):
+        try:
+            poll_id = await run_in_threadpool(self._write_close, slug)
+        except Exception:
+            logger.exception("Auto-closing poll %s failed", slug)
+            self.stats["failed"] += 1
+            return
+        if poll_id is None:
+            # Closed by hand, deleted, or already closed by another worker
+            return
+        logger.info("Auto-closed poll %s (closes_at %s)", slug, closes_at)
+        self.stats["closed"] += 1
+        poll_snapshots.bump(slug)
+        await scheduler.publish({"event": "update", "poll_id": poll_id}, slug)
+
+    def _write_close(self, slug: str) -> Optional[int]:
+        db = database.SessionLocal()
+        try:
+            poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
+            if poll is None:
+                return None
+            # Only the worker whose update matches closes the poll and announces it
+            result = db.execute(
+                update(models.Poll)
+                .where(models.Poll.id == poll.id, models.Poll.is_active == True, models.Poll.closes_at <= datetime.utcnow())
+                .values(is_active=False, closed_at=datetime.utcnow())
+            )
+            db.commit()
+            return poll.id if result.rowcount else None
+        finally:
+            db.close()
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            upcoming = min(self._deadlines.values()) if self._deadlines else None
+            return {
+                **self.stats,
+                "scheduled": len(self._deadlines),
+                "heap_size": len(self._heap),
+                "next_close": upcoming.isoformat() + "Z" if upcoming else None,
+            }
+
+
+close_scheduler = CloseScheduler()
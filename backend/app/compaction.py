@@ -0,0 +1,333 @@
+"""
+Compaction of long-closed polls.
+
+Once a poll has been closed for COMPACT_AFTER_DAYS, its `votes` rows only matter as
+totals. Compaction replaces them with one `question_archives` row per question: the
+vote count per option, plus the text answers as a zlib-compressed JSON list. The
+`vote_counts` rollup is left untouched, so results do not change; the tally build,
+`GET /polls/{slug}` and the export read the archive where they used to read votes.
+
+Archived votes keep their question, option and text but not their own id or
+timestamp: they are served with id 0 and the time of the poll's last archived vote.
+A reopened poll takes new votes as usual; when it has been closed long enough
+again, they are merged into the same archive rows.
+
+Compacted polls are announced with an "update" frame, like any other change, so
+every worker drops its cached copy. The CLI runs in its own process and can only
+reach the servers through the Redis backplane (BROADCAST_BACKEND=redis); with the
+local backplane, run compaction inside the server (COMPACTION_INTERVAL) instead.
+
+    python -m app.compaction              # compact polls closed longer than the window
+    python -m app.compaction --dry-run    # only list them
+    python -m app.compaction --days 7
+"""
+import asyncio
+import codecs
+import json
+import logging
+import os
+import sys
+import zlib
+from collections import Counter
+from itertools import chain
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from . import models, database
+from .snapshots import poll_snapshots
+from .websockets import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Days a poll stays closed before its votes are compacted
+COMPACT_AFTER_DAYS = int(os.getenv("COMPACT_AFTER_DAYS", "30"))
+# Seconds between in-process compaction runs; 0 leaves it to `python -m app.compaction` (cron)
+COMPACTION_INTERVAL = int(os.getenv("COMPACTION_INTERVAL", "0"))
+
+Answer = Tuple[Optional[int], str]
+
+# Most bytes of answers inflated at a time by `iter_answers`
+INFLATE_CHUNK = 64 * 1024
+
+
+def pack_answers(answers: Iterable[Answer]) -> Optional[bytes]:
+    """Compress answers as one JSON list, deflating them as they come; None if there are none."""
+    deflater = zlib.compressobj(9)
+    blob = bytearray()
+    separator = b"["
+    for option_id, text in answers:
+        blob += deflater.compress(separator + json.dumps([option_id, text], separators=(",", ":")).encode())
+        separator = b","
+    if separator == b"[":
+        return None
+    blob += deflater.compress(b"]") + deflater.flush()
+    return bytes(blob)
+
+
+def iter_answers(blob: Optional[bytes]) -> Iterator[Answer]:
+    """
+    The answers of a `pack_answers` blob, inflated and parsed INFLATE_CHUNK bytes at a time, so
+    memory stays flat however many answers a question archived. Every element is
+    itself a JSON array, so a cut-off element never parses and waits for more input.
+    """
+    if not blob:
+        return
+    inflater = zlib.decompressobj()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    decoder = json.JSONDecoder()
+    compressed = blob
+    text, pos, opened, finished = "", 0, False, False
+    while True:
+        if text and not opened:
+            # Past the list's own "["
+            pos, opened = 1, True
+        while pos < len(text):
+            if text[pos] == ",":
+                pos += 1
+                continue
+            if text[pos] == "]":
+                return
+            try:
+                (option_id, answer), pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                if finished:
+                    raise
+                break
+            yield option_id, answer
+        if finished:
+            return
+        text, pos = text[pos:], 0
+        data = inflater.decompress(compressed, INFLATE_CHUNK)
+        compressed = inflater.unconsumed_tail
+        if not compressed and len(data) < INFLATE_CHUNK:
+            data += inflater.flush()
+            finished = True
+        text += utf8.decode(data, final=finished)
+
+
+def archived_votes(archive: models.QuestionArchive, option_ids: set) -> Iterator[dict]:
+    """
+    The archived votes of a question, shaped like schemas.Vote rows, generated one at a
+    time. Votes without a text answer are all alike, so each option's are one shared
+    dict yielded repeatedly; callers must not modify them.
+    """
+    base = {"id": 0, "question_id": archive.question_id, "created_at": archive.last_vote_at or archive.archived_at}
+    answered = Counter()
+    for option_id, text in iter_answers(archive.answers):
+        answered[option_id] += 1
+        # Options deleted since compaction: their votes lose the option, like live ones do
+        yield {**base, "option_id": option_id if option_id in option_ids else None, "text_answer": text}
+    for option_id, n in json.loads(archive.counts):
+        vote = {**base, "option_id": option_id if option_id in option_ids else None, "text_answer": None}
+        for _ in range(n - answered[option_id]):
+            yield vote
+
+
+def archived_counts(db: Session, question_ids=None) -> Dict[Tuple[int, Optional[int]], int]:
+    """Archived votes per (question_id, option_id), for recounting the vote_counts rollup."""
+    stmt = select(models.QuestionArchive.question_id, models.QuestionArchive.counts)
+    options = select(models.Option.id)
+    if question_ids is not None:
+        stmt = stmt.where(models.QuestionArchive.question_id.in_(question_ids))
+        options = options.where(models.Option.question_id.in_(question_ids))
+    rows = db.execute(stmt).all()
+    if not rows:
+        return {}
+    option_ids = set(db.execute(options).scalars())
+    counts: Dict[Tuple[int, Optional[int]], int] = {}
+    for question_id, stored in rows:
+        for option_id, n in json.loads(stored):
+            key = (question_id, option_id if option_id in option_ids else None)
+            counts[key] = counts.get(key, 0) + n
+    return counts
+
+
+def compact_poll(db: Session, poll_id: int) -> Optional[int]:
+    """Move a closed poll's votes into its question archives. Returns the number of votes moved, or None if the poll is open."""
+    now = datetime.utcnow()
+    # Claim the poll first: a poll reopened since it was selected is skipped, and on
+    # SQLite this takes the write lock, so no vote lands between the read and the delete
+    claimed = db.execute(
+        update(models.Poll).where(models.Poll.id == poll_id, models.Poll.is_active == False).values(archived_at=now)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        return None
+    question_ids = list(db.execute(select(models.Question.id).where(models.Question.poll_id == poll_id)).scalars())
+    moved = sum(_compact_question(db, question_id, now) for question_id in question_ids)
+    db.commit()
+    return moved
+
+
+def _compact_question(db: Session, question_id: int, now: datetime) -> int:
+    """
+    Fold one question's votes into its archive. Counts come from one grouped query
+    and the answers are streamed from the votes (after the archived ones) straight
+    into the compressor, so memory stays flat however many votes there are.
+    """
+    last_id = db.execute(select(func.max(models.Vote.id)).where(models.Vote.question_id == question_id)).scalar()
+    if last_id is None:
+        return 0
+    in_question = (models.Vote.question_id == question_id, models.Vote.id <= last_id)
+    grouped = db.execute(
+        select(models.Vote.option_id, func.count(models.Vote.id), func.max(models.Vote.created_at))
+        .where(*in_question)
+        .group_by(models.Vote.option_id)
+    ).all()
+
+    archive = db.execute(select(models.QuestionArchive).where(models.QuestionArchive.question_id == question_id)).scalar_one_or_none()
+    if archive is None:
+        archive = models.QuestionArchive(question_id=question_id, vote_count=0, counts="[]")
+        db.add(archive)
+    merged = Counter({option_id: n for option_id, n in json.loads(archive.counts)})
+    latest = archive.last_vote_at
+    for option_id, n, created_at in grouped:
+        merged[option_id] += n
+        if created_at and (latest is None or created_at > latest):
+            latest = created_at
+    archive.counts = json.dumps(sorted(merged.items(), key=lambda item: item[0] or 0), separators=(",", ":"))
+    archive.vote_count = sum(merged.values())
+    new_answers = db.execute(
+        select(models.Vote.option_id, models.Vote.text_answer)
+        .where(*in_question, models.Vote.text_answer.isnot(None))
+        .order_by(models.Vote.id)
+        .execution_options(yield_per=1000)
+    )
+    archive.answers = pack_answers(chain(iter_answers(archive.answers), new_answers))
+    archive.last_vote_at = latest
+    archive.archived_at = now
+
+    db.execute(delete(models.Vote).where(*in_question).execution_options(synchronize_session=False))
+    db.flush()
+    # Only this question's archive is held at a time
+    db.expunge(archive)
+    return sum(n for _, n, _ in grouped)
+
+
+def _candidates(db: Session, days: int) -> List[Tuple[int, str]]:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    has_votes = (
+        select(models.Vote.id)
+        .join(models.Question, models.Vote.question_id == models.Question.id)
+        .where(models.Question.poll_id == models.Poll.id)
+        .exists()
+    )
+    # Polls closed through PUT /polls/{slug} have no closed_at; fall back to the deadline, then creation
+    closed = func.coalesce(models.Poll.closed_at, models.Poll.closes_at, models.Poll.created_at)
+    stmt = (
+        select(models.Poll.id, models.Poll.slug)
+        .where(models.Poll.is_active == False, closed < cutoff)
+        # Never compacted, or reopened and voted on since
+        .where((models.Poll.archived_at.is_(None)) | has_votes)
+        .order_by(models.Poll.id)
+    )
+    return db.execute(stmt).all()
+
+
+def compact_closed_polls(days: int = COMPACT_AFTER_DAYS, dry_run: bool = False) -> List[Tuple[int, str, Optional[int]]]:
+    """
+    Compact every poll closed more than `days` ago, each in its own transaction.
+    Returns (poll_id, slug, votes moved) per compacted poll.
+    """
+    db = database.SessionLocal()
+    try:
+        candidates = _candidates(db, days)
+        if dry_run:
+            return [(poll_id, slug, None) for poll_id, slug in candidates]
+        results = []
+        for poll_id, slug in candidates:
+            try:
+                moved = compact_poll(db, poll_id)
+            except Exception:
+                db.rollback()
+                logger.exception("Compaction of poll %s failed", slug)
+                continue
+            if moved is None:
+                continue
+            poll_snapshots.bump(slug)
+            results.append((poll_id, slug, moved))
+        return results
+    finally:
+        db.close()
+
+
+class Compactor:
+    """Runs `compact_closed_polls` every COMPACTION_INTERVAL seconds, when enabled."""
+
+    def __init__(self, interval: int = COMPACTION_INTERVAL, days: int = COMPACT_AFTER_DAYS):
+        self.interval = interval
+        self.days = days
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"runs": 0, "polls": 0, "votes": 0, "failed": 0}
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                results = await run_in_threadpool(compact_closed_polls, self.days)
+            except Exception:
+                logger.exception("Compaction run failed")
+                self.stats["failed"] += 1
+                continue
+            self.stats["runs"] += 1
+            self.stats["polls"] += len(results)
+            self.stats["votes"] += sum(moved for _, _, moved in results)
+            if results:
+                logger.info("Compacted %d polls (%d votes)", len(results), sum(moved for _, _, moved in results))
+            # Other workers still hold the old snapshots
+            for poll_id, slug, _ in results:
+                await scheduler.publish({"event": "update", "poll_id": poll_id}, slug)
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "enabled": self._task is not None, "interval_s": self.interval, "after_days": self.days}
+
+
+compactor = Compactor()
+
+
+async def announce(backplane, results):
+    """Publish an "update" frame per compacted poll, so running servers drop their cached copies."""
+    try:
+        for poll_id, slug, _ in results:
+            await backplane.publish({"event": "update", "poll_id": poll_id}, slug)
+    finally:
+        await backplane.client.aclose()
+
+
+if __name__ == "__main__":
+    # Not at the top: backplane -> tally -> compaction
+    from .backplane import RedisBackplane, backplane
+
+    days = COMPACT_AFTER_DAYS
+    if "--days" in sys.argv:
+        days = int(sys.argv[sys.argv.index("--days") + 1])
+    dry_run = "--dry-run" in sys.argv
+    results = compact_closed_polls(days, dry_run=dry_run)
+    for _, slug, moved in results:
+        print(f"{slug}: {'would be compacted' if dry_run else f'{moved} votes archived'}")
+    print(f"{len(results)} polls {'eligible' if dry_run else 'compacted'}.")
+    if results and not dry_run:
+        if isinstance(backplane, RedisBackplane):
+            asyncio.run(announce(backplane, results))
+            print(f"Announced {len(results)} polls through Redis.")
+        else:
+            print("Running servers keep cached copies of these polls until they next change: "
+                  "set BROADCAST_BACKEND=redis, or compact inside the server with COMPACTION_INTERVAL.")
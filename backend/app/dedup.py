@@ -0,0 +1,95 @@
+"""
+Recently seen client vote ids.
+
+Phones on flaky Wi-Fi retry `POST /polls/{slug}/vote` with the same vote id. The
+ids seen in roughly the last VOTE_DEDUP_WINDOW seconds are kept in two rotating
+sets (current and previous generation), so a check is one or two hash lookups and
+memory is capped at twice VOTE_DEDUP_MAX_IDS. Anything older is caught by the
+unique index on votes.client_vote_id.
+
+An id is only recorded once its vote is stored (or queued, in write-behind mode,
+where the vote is acknowledged at that point). While the first attempt is still
+writing, a retry waits for its outcome instead of being told it is a duplicate:
+if the write fails, the retry gets to store the vote itself.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Seconds an id is remembered in memory (at least; up to twice this)
+VOTE_DEDUP_WINDOW = int(os.getenv("VOTE_DEDUP_WINDOW", "600"))
+# Ids per generation; a full generation rotates early
+VOTE_DEDUP_MAX_IDS = int(os.getenv("VOTE_DEDUP_MAX_IDS", "200000"))
+# Longest accepted vote / participant id
+MAX_ID_LENGTH = 64
+
+
+def dedup_key(vote_id: Optional[str], participant_id: Optional[str]) -> Optional[str]:
+    """The stored idempotency key: the vote id, scoped to the participant when one is given."""
+    if not vote_id:
+        return None
+    return f"{participant_id}:{vote_id}" if participant_id else vote_id
+
+
+class RecentIds:
+    def __init__(self, window: int = VOTE_DEDUP_WINDOW, max_ids: int = VOTE_DEDUP_MAX_IDS):
+        self.window = window
+        self.max_ids = max_ids
+        self._current = set()
+        self._previous = set()
+        # Ids claimed by a request that is still writing, set once it is done either way
+        self._inflight: Dict[str, asyncio.Event] = {}
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "duplicates": 0, "waited": 0, "rotations": 0}
+
+    async def claim(self, key: str) -> bool:
+        """
+        Claim `key` for writing its vote. Returns False if the vote is already stored
+        (a duplicate). Otherwise the caller must `confirm` or `forget` the key.
+        """
+        with self._lock:
+            self.stats["checked"] += 1
+        while True:
+            with self._lock:
+                if key in self._current or key in self._previous:
+                    self.stats["duplicates"] += 1
+                    return False
+                done = self._inflight.get(key)
+                if done is None:
+                    self._inflight[key] = asyncio.Event()
+                    return True
+                self.stats["waited"] += 1
+            await done.wait()
+
+    def confirm(self, key: str):
+        """Record a claimed key whose vote has been stored."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rotated_at >= self.window or len(self._current) >= self.max_ids:
+                self._previous = self._current
+                self._current = set()
+                self._rotated_at = now
+                self.stats["rotations"] += 1
+            self._current.add(key)
+            done = self._inflight.pop(key, None)
+        if done is not None:
+            done.set()
+
+    def forget(self, key: str):
+        """Drop a key whose vote was not stored, so a retry is accepted."""
+        with self._lock:
+            self._current.discard(key)
+            self._previous.discard(key)
+            done = self._inflight.pop(key, None)
+        if done is not None:
+            done.set()
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._current) + len(self._previous), "in_flight": len(self._inflight), "window_s": self.window}
+
+
+recent_votes = RecentIds()
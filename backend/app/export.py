@@ -0,0 +1,125 @@
+"""
+Raw response export.
+
+Rows come straight from the `votes` table joined with their question and option,
+fetched in batches of EXPORT_BATCH_SIZE over a streamed cursor, so memory use does
+not grow with the size of the poll and the first rows go out before the query
+has finished. Votes of compacted questions come first, rebuilt from their archive
+(see compaction.py) with an empty vote_id; archives are read one at a time and
+their answers inflated in chunks, so those stay flat in memory too.
+"""
+import csv
+import io
+import json
+import os
+from typing import Iterator
+
+from sqlalchemy import select
+
+from . import models, database, compaction
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+COLUMNS = [
+    "vote_id",
+    "created_at",
+    "question_id",
+    "question_order",
+    "question",
+    "question_type",
+    "option_id",
+    "option",
+    "text_answer",
+]
+
+
+def _rows_query(poll_id: int):
+    return (
+        select(
+            models.Vote.id,
+            models.Vote.created_at,
+            models.Question.id,
+            models.Question.order,
+            models.Question.text,
+            models.Question.question_type,
+            models.Vote.option_id,
+            models.Option.text,
+            models.Vote.text_answer,
+        )
+        .join(models.Question, models.Vote.question_id == models.Question.id)
+        .outerjoin(models.Option, models.Vote.option_id == models.Option.id)
+        .where(models.Question.poll_id == poll_id)
+        .order_by(models.Vote.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def _archived_rows(db, poll_id: int):
+    # One archive in memory at a time, and its votes generated as they are written out
+    questions = db.execute(
+        select(models.QuestionArchive.id, models.Question.id, models.Question.order, models.Question.text, models.Question.question_type)
+        .join(models.Question, models.QuestionArchive.question_id == models.Question.id)
+        .where(models.Question.poll_id == poll_id)
+        .order_by(models.Question.order, models.Question.id)
+    ).all()
+    for archive_id, question_id, order, text, question_type in questions:
+        archive = db.get(models.QuestionArchive, archive_id)
+        options = dict(db.execute(select(models.Option.id, models.Option.text).where(models.Option.question_id == question_id)).all())
+        for vote in compaction.archived_votes(archive, set(options)):
+            yield (
+                None,
+                vote["created_at"],
+                question_id,
+                order,
+                text,
+                question_type,
+                vote["option_id"],
+                options.get(vote["option_id"]),
+                vote["text_answer"],
+            )
+        db.expunge(archive)
+
+
+def _batches(poll_id: int):
+    # The response outlives the request's session, so the export opens its own
+    db = database.SessionLocal()
+    try:
+        batch = []
+        for row in _archived_rows(db, poll_id):
+            batch.append(row)
+            if len(batch) == EXPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        result = db.execute(_rows_query(poll_id))
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def _values(row) -> list:
+    values = list(row)
+    if values[1] is not None:
+        values[1] = values[1].isoformat() + "Z"
+    if values[5] is not None:
+        values[5] = values[5].value
+    return values
+
+
+def iter_csv(poll_id: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for batch in _batches(poll_id):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_values(row) for row in batch)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(poll_id: int) -> Iterator[str]:
+    for batch in _batches(poll_id):
+        yield "".join(json.dumps(dict(zip(COLUMNS, _values(row)))) + "\n" for row in batch)
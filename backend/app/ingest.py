@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, select
+
+from . import models, database, vote_counts
+from .dedup import recent_votes
+from .tally import tally_cache
+from .snapshots import poll_snapshots
+
+logger = logging.getLogger(__name__)
+
+# "sync": each vote is committed inside its request (default).
+# "write_behind": votes are acknowledged after validation and written in batches.
+VOTE_INGEST_MODE = os.getenv("VOTE_INGEST_MODE", "sync")
+# Largest number of votes written in one transaction
+VOTE_BATCH_SIZE = int(os.getenv("VOTE_BATCH_SIZE", "500"))
+# Longest a vote waits for its batch to fill up (ms)
+VOTE_BATCH_MS = int(os.getenv("VOTE_BATCH_MS", "50"))
+# Accepted votes allowed to wait for the writer before new ones are turned away
+VOTE_QUEUE_MAX = int(os.getenv("VOTE_QUEUE_MAX", "20000"))
+# Attempts per batch before it is given up on
+VOTE_WRITE_RETRIES = 3
+
+# Queued by `stop`: the writer flushes what it holds and exits when it reaches it
+_STOP = object()
+
+
+class VoteWriter:
+    """
+    Background writer for write-behind ingestion.
+
+    `submit` puts a validated vote on an in-process queue; `_run` drains it into
+    batches of up to VOTE_BATCH_SIZE votes (or whatever arrived within VOTE_BATCH_MS)
+    and writes each batch with one bulk insert in one transaction.
+    """
+
+    def __init__(self, batch_size: int = VOTE_BATCH_SIZE, batch_ms: int = VOTE_BATCH_MS, max_queue: int = VOTE_QUEUE_MAX):
+        self.batch_size = batch_size
+        self.window = batch_ms / 1000
+        self.max_queue = max_queue
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "rejected": 0,        # queue full
+            "failed": 0,          # votes dropped after all retries
+            "duplicates": 0,      # retries found already stored at write time
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer and flush every vote still queued."""
+        if self._task is None:
+            return
+        # Not a cancel: the batch being collected (or written) when we stop is flushed too
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+        while not self.queue.empty():
+            batch = []
+            while not self.queue.empty() and len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+            await self._flush(batch)
+
+    def submit(self, slug: str, question_id: int, option_id: Optional[int], text_answer: Optional[str], client_vote_id: Optional[str] = None) -> bool:
+        """Queue a validated vote. Returns False if the queue is full."""
+        return self.submit_many(slug, [(question_id, option_id, text_answer, client_vote_id)])
+
+    def submit_many(self, slug: str, votes: List[Tuple[int, Optional[int], Optional[str], Optional[str]]]) -> bool:
+        """
+        Queue several validated (question_id, option_id, text_answer, client_vote_id)
+        votes, all or none. Returns False if the queue has no room for all of them.
+        """
+        if self.queue.qsize() + len(votes) > self.max_queue:
+            self.stats["rejected"] += len(votes)
+            return False
+        now = datetime.utcnow()
+        for question_id, option_id, text_answer, client_vote_id in votes:
+            self.queue.put_nowait({
+                "slug": slug,
+                "question_id": question_id,
+                "option_id": option_id,
+                "text_answer": text_answer,
+                "created_at": now,
+                "client_vote_id": client_vote_id,
+            })
+            tally_cache.add_pending(slug, question_id, option_id, text_answer)
+        self.stats["enqueued"] += len(votes)
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            vote = await self.queue.get()
+            if vote is _STOP:
+                return
+            batch = [vote]
+            stopping = False
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                try:
+                    vote = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    await asyncio.sleep(min(remaining, 0.005))
+                    continue
+                if vote is _STOP:
+                    stopping = True
+                    break
+                batch.append(vote)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[dict]):
+        if not batch:
+            return
+        started = time.perf_counter()
+        for attempt in range(VOTE_WRITE_RETRIES):
+            try:
+                await run_in_threadpool(self._write, batch)
+                self.stats["written"] += len(batch)
+                break
+            except Exception:
+                logger.exception("Writing %d votes failed (attempt %d)", len(batch), attempt + 1)
+                await asyncio.sleep(0.1 * (attempt + 1))
+        else:
+            self._abandon(batch)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["batches"] += 1
+        self.stats["last_flush_ms"] = round(elapsed_ms, 2)
+        self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed_ms), 2)
+        self.stats["total_flush_ms"] += elapsed_ms
+
+    def _abandon(self, batch: List[dict]):
+        """Give up on a batch: its votes were acknowledged but will never be stored."""
+        self.stats["failed"] += len(batch)
+        slugs = sorted({v["slug"] for v in batch})
+        logger.error("Dropped %d acknowledged votes for %s after %d failed writes", len(batch), ", ".join(slugs), VOTE_WRITE_RETRIES)
+        # Let the clients' retries through instead of answering them as duplicates
+        for vote in batch:
+            if vote["client_vote_id"]:
+                recent_votes.forget(vote["client_vote_id"])
+        tally_cache.drop_pending((v["slug"], v["question_id"], v["option_id"], v["text_answer"]) for v in batch)
+        # The live tallies counted these votes when they were accepted; rebuild them from the database
+        for slug in slugs:
+            tally_cache.invalidate(slug)
+
+    def _write(self, batch: List[dict]):
+        slugs = {v["slug"] for v in batch}
+        tally_cache.begin_flush(slugs)
+        written = []
+        db = database.SessionLocal()
+        try:
+            # Retries that outlived the in-memory dedup window were acknowledged too;
+            # drop the ones already stored (a unique-index lookup per id)
+            keys = [v["client_vote_id"] for v in batch if v["client_vote_id"]]
+            stored = set()
+            if keys:
+                stored = set(db.execute(select(models.Vote.client_vote_id).where(models.Vote.client_vote_id.in_(keys))).scalars())
+            fresh, seen, dropped_slugs = [], set(), set()
+            for vote in batch:
+                key = vote["client_vote_id"]
+                if key and (key in stored or key in seen):
+                    dropped_slugs.add(vote["slug"])
+                    continue
+                seen.add(key)
+                fresh.append(vote)
+            counts = {}
+            for vote in fresh:
+                count_key = (vote["question_id"], vote["option_id"])
+                counts[count_key] = counts.get(count_key, 0) + 1
+            if fresh:
+                db.execute(insert(models.Vote), [{k: v for k, v in vote.items() if k != "slug"} for vote in fresh])
+                vote_counts.add_votes(db, counts)
+            db.commit()
+            written = [(v["slug"], v["question_id"], v["option_id"], v["text_answer"]) for v in batch]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+            # A failed batch stays pending until it is retried or abandoned
+            tally_cache.end_flush(slugs, written)
+        if dropped_slugs:
+            self.stats["duplicates"] += len(batch) - len(fresh)
+            # The in-memory tally counted the dropped votes when they were accepted
+            for slug in dropped_slugs:
+                tally_cache.invalidate(slug)
+        # Poll snapshots embed the votes, so they are only current once the batch is written
+        for slug in slugs:
+            poll_snapshots.bump(slug)
+
+    def snapshot_stats(self) -> dict:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "total_flush_ms": round(self.stats["total_flush_ms"], 2),
+            "mode": VOTE_INGEST_MODE,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "avg_flush_ms": round(self.stats["total_flush_ms"] / batches, 2) if batches else 0.0,
+        }
+
+
+vote_writer = VoteWriter()
@@ -1,12 +1,26 @@
 import os
-from fastapi import FastAPI, WebSocket as FastAPIWebSocket, WebSocketDisconnect
+import json
+import secrets
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, WebSocket as FastAPIWebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from . import models, database, auth
+from . import models, database, auth, vote_counts, migrations
 from .routers import polls
-from .websockets import manager
+from .websockets import manager, scheduler
+from .tally import tally_snapshot
+from .snapshots import poll_snapshots
+from .backplane import backplane
+from .ingest import vote_writer, VOTE_INGEST_MODE
+from .closer import close_scheduler
+from .passwords import hash_pool
+from .dedup import recent_votes
+from .compaction import compactor
+from . import metrics, profiling, compression
 
 
 models.Base.metadata.create_all(bind=database.engine)
+migrations.run_migrations()
+vote_counts.ensure_backfilled()
 
 # Docs disabled globally for security/audit compliance
 app = FastAPI(title="Live Polling API", docs_url=None, redoc_url=None)
@@ -21,20 +35,141 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+if profiling.SQL_PROFILING:
+    profiling.instrument(database.engine)
+    profiling.instrument(database.async_engine.sync_engine)
+    app.add_middleware(profiling.ProfilingMiddleware)
 
 app.include_router(auth.router)
 app.include_router(polls.router)
 
+# Protocol on /ws/{slug} (the server -> client frames are also served as Server-Sent Events
+# by GET /polls/{slug}/stream, for displays that never send anything):
+#   server -> client
+#     {"event": "snapshot", "version", "questions", "options", "terms", ...}  full tally (on connect / resync)
+#     {"event": "tally", "base", "version", "questions", "options", "added", "answers"?, "terms"?}
+#         changed counts only; "terms" is the new top-K word list of an open-ended question
+#     {"event": "update", "poll_id"}  poll structure changed, refetch the poll and resync
+#     {"event": "ping", "interval"}  heartbeat every `interval` seconds
+#   client -> server
+#     {"action": "resync"}  sent when a tally frame's base does not match the client's version
+#     {"action": "pong"}  heartbeat reply; a client that sends nothing for WS_IDLE_TIMEOUT is disconnected
 @app.websocket("/ws/{slug}")
 async def websocket_endpoint(websocket: FastAPIWebSocket, slug: str):
-    await manager.connect(websocket, slug)
+    connection = await manager.connect(websocket, slug)
+    if connection is None:
+        return
     try:
+        snapshot = await run_in_threadpool(tally_snapshot, slug)
+        if snapshot:
+            connection.send_json(snapshot)
         while True:
-            await websocket.receive_text()
-            # Optionally handle client messages
+            data = await websocket.receive_text()
+            connection.touch()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("action") == "resync":
+                snapshot = await run_in_threadpool(tally_snapshot, slug)
+                if snapshot:
+                    connection.send_json(snapshot)
     except WebSocketDisconnect:
-        manager.disconnect(websocket, slug)
+        pass
+    finally:
+        manager.disconnect(connection)
+
+@app.on_event("startup")
+async def start_background_workers():
+    await manager.start()
+    await backplane.start()
+    scheduler.deliver = backplane.publish
+    if VOTE_INGEST_MODE == "write_behind":
+        await vote_writer.start()
+    await close_scheduler.start()
+    await compactor.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await compactor.stop()
+    await close_scheduler.stop()
+    # Pending votes first, so nothing acknowledged is lost
+    await vote_writer.stop()
+    await scheduler.flush_all()
+    await backplane.stop()
+    await manager.stop()
+
+# Async so the registries (connections, replay buffers) are read on the event loop that mutates them
+@app.get("/stats")
+async def read_stats(current_user: auth.Principal = Depends(auth.get_current_user)):
+    # Runtime counters for tuning under load
+    stats = {
+        "broadcast": scheduler.snapshot_stats(),
+        "connections": manager.snapshot_stats(),
+        "ingest": vote_writer.snapshot_stats(),
+        "poll_snapshots": poll_snapshots.snapshot_stats(),
+        "auto_close": close_scheduler.snapshot_stats(),
+        "auth_cache": auth.token_cache.snapshot_stats(),
+        "password_hashing": hash_pool.snapshot_stats(),
+        "vote_dedup": recent_votes.snapshot_stats(),
+        "compaction": compactor.snapshot_stats(),
+    }
+    if hasattr(backplane, "stats"):
+        stats["backplane"] = backplane.stats
+    return stats
+
+# Async so the registry is read on the event loop that mutates it
+@app.get("/stats/connections")
+async def read_connection_stats(limit: int = 20, current_user: auth.Principal = Depends(auth.get_current_user)):
+    """WebSocket connections and their memory use for the busiest polls."""
+    return {"totals": manager.snapshot_stats(), "polls": manager.describe_all(limit)}
+
+@app.get("/stats/connections/{slug}")
+async def read_poll_connection_stats(slug: str, current_user: auth.Principal = Depends(auth.get_current_user)):
+    return manager.describe(slug)
+
+metrics.watch_pool(database.engine, "sync")
+metrics.watch_pool(database.async_engine.sync_engine, "async")
+
+@metrics.registry.collector
+def collect_runtime():
+    by_slug = sorted(((slug, len(c)) for slug, c in manager.active_connections.items()), key=lambda item: -item[1])
+    yield ("quickpoll_websocket_connections", "gauge", "Open WebSocket connections.",
+           [({}, manager.count)])
+    yield ("quickpoll_websocket_poll_connections", "gauge",
+           f"Open WebSocket connections of the {metrics.METRICS_TOP_SLUGS} busiest polls.",
+           [({"slug": slug}, n) for slug, n in by_slug[:metrics.METRICS_TOP_SLUGS]])
+    yield ("quickpoll_websocket_events_total", "counter",
+           "Frames dropped, sends failed, slow clients evicted, silent clients reaped and connections refused at a cap.",
+           [({"event": key}, manager.stats[key]) for key in ("dropped_frames", "send_failures", "evictions", "reaped", "rejected")])
+    yield ("quickpoll_broadcast_frames_total", "counter", "Broadcast frames published, merged while queued, and sent.",
+           [({"stage": key}, scheduler.stats[key]) for key in ("published", "merged", "sent")])
+    yield ("quickpoll_broadcast_failures_total", "counter", "Broadcast deliveries that raised.",
+           [({}, scheduler.stats["errors"])])
+    yield ("quickpoll_vote_queue_depth", "gauge", "Write-behind votes waiting to be written.",
+           [({}, vote_writer.queue.qsize() if vote_writer.queue is not None else 0)])
+    yield ("quickpoll_votes_written_total", "counter", "Write-behind votes written, and given up on after retries.",
+           [({"outcome": "written"}, vote_writer.stats["written"]), ({"outcome": "failed"}, vote_writer.stats["failed"])])
+    yield ("quickpoll_db_pool_connections", "gauge", "Database pool connections by state.",
+           metrics.pool_samples(database.engine, "sync") + metrics.pool_samples(database.async_engine.sync_engine, "async"))
+    yield ("quickpoll_cache_requests_total", "counter", "Cache lookups by cache and result.",
+           [({"cache": "poll_snapshot", "result": "hit"}, poll_snapshots.stats["hits"]),
+            ({"cache": "poll_snapshot", "result": "miss"}, poll_snapshots.stats["misses"]),
+            ({"cache": "auth_token", "result": "hit"}, auth.token_cache.stats["hits"]),
+            ({"cache": "auth_token", "result": "miss"}, auth.token_cache.stats["misses"])])
+
+# Async so the collectors read the connection registry on the event loop that mutates it
+@app.get("/metrics")
+async def read_metrics(request: Request):
+    # Prometheus scrape target; set METRICS_TOKEN to require "Authorization: Bearer <token>".
+    # The nginx front end does not proxy it, so without a token only the internal network reaches it
+    if metrics.METRICS_TOKEN and not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {metrics.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return Response(content=metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,205 @@
+"""
+Prometheus metrics, rendered in the text exposition format by `GET /metrics`.
+
+Hot paths only touch a dict under a lock (a counter increment or one histogram
+bucket). Everything that already keeps its own counters (connections, broadcast
+scheduler, vote writer, caches, DB pools) is read when the endpoint is scraped.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Optional bearer token for /metrics; unset leaves the endpoint open to the scraper
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Slugs reported individually in the per-poll connection gauge (busiest first)
+METRICS_TOP_SLUGS = int(os.getenv("METRICS_TOP_SLUGS", "20"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FANOUT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, n: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(counts), total) for labels, (counts, total) in self._values.items())
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        # Called at scrape time; each returns (name, type, help, [(labels dict, value)])
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[tuple]]):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "quickpoll_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+votes_total = registry.counter(
+    "quickpoll_votes_total",
+    "Votes received by POST /polls/{slug}/vote and /ballot (one per answer), by ingest mode and outcome.",
+    ("mode", "outcome"),
+)
+broadcast_fanout_duration = registry.histogram(
+    "quickpoll_broadcast_fanout_seconds",
+    "Time to encode a frame and queue it on every socket of a poll.",
+    buckets=FANOUT_BUCKETS,
+)
+db_checkouts_total = registry.counter(
+    "quickpoll_db_connection_checkouts_total",
+    "Connections handed out by the database pools.",
+    ("engine",),
+)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency of every HTTP request under its route template. Streamed
+    responses (exports, event streams) are timed to their first chunk: how long
+    the stream stays open is up to the client, not the server.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = "500"
+        first_chunk = None
+
+        async def send_wrapper(message):
+            nonlocal status, first_chunk
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            elif message["type"] == "http.response.body" and first_chunk is None and message.get("more_body", False):
+                first_chunk = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            path = getattr(route, "path", None) or "unmatched"
+            finished = first_chunk if first_chunk is not None else time.perf_counter()
+            http_request_duration.observe(finished - started, scope["method"], path, status)
+
+
+def watch_pool(engine, name: str):
+    """Count connection checkouts of a (sync) engine's pool."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        db_checkouts_total.inc(name)
+
+
+def pool_samples(engine, name: str) -> List[tuple]:
+    pool = engine.pool
+    samples = []
+    for stat in ("size", "checkedout", "overflow", "checkedin"):
+        reader = getattr(pool, stat, None)
+        if callable(reader):
+            samples.append(({"engine": name, "state": stat}, reader()))
+    return samples
@@ -0,0 +1,133 @@
+"""
+Versioned schema migrations.
+
+`create_all` only creates missing tables; it never changes existing ones. Every
+schema change to an existing table goes here as a numbered migration, and each
+applied version is recorded in `schema_migrations`. Pending migrations run at
+startup, right after `create_all`, so a migration must also be a no-op on a fresh
+database whose tables were just created from the models.
+
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations --status   # list applied and pending versions
+"""
+import logging
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from . import database
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def add_slide_duration(conn: Connection):
+    # Formerly update_db_duration.py
+    _add_column(conn, "polls", "slide_duration", "INTEGER DEFAULT 3")
+
+
+def add_enable_title_page(conn: Connection):
+    # Formerly update_db_title.py
+    _add_column(conn, "polls", "enable_title_page", "BOOLEAN DEFAULT 0")
+
+
+# Also declared in the models' __table_args__ so fresh databases get them from create_all
+INDEXES = [
+    # Per-question tallies, answer streams and question cascades; also serves question_id alone
+    ("ix_votes_question_option", "votes", "question_id, option_id"),
+    # Option deletes and their vote lookups
+    ("ix_votes_option", "votes", "option_id"),
+    ("ix_options_question", "options", "question_id"),
+    # A poll's questions, in display order
+    ("ix_questions_poll_order", "questions", 'poll_id, "order"'),
+    # Dashboard listing: status filter, newest first
+    ("ix_polls_active_created", "polls", "is_active, created_at, id"),
+]
+
+
+def add_foreign_key_indexes(conn: Connection):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def add_client_vote_id(conn: Connection):
+    _add_column(conn, "votes", "client_vote_id", "VARCHAR")
+    # NULLs do not collide, so votes without a key are unaffected
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_votes_client_vote_id ON votes (client_vote_id)"))
+
+
+def add_poll_archived_at(conn: Connection):
+    # question_archives is a new table; create_all has already made it
+    _add_column(conn, "polls", "archived_at", "DATETIME")
+
+
+# (version, name, upgrade); append only, never renumber
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add_slide_duration", add_slide_duration),
+    (2, "add_enable_title_page", add_enable_title_page),
+    (3, "add_foreign_key_indexes", add_foreign_key_indexes),
+    (4, "add_client_vote_id", add_client_vote_id),
+    (5, "add_poll_archived_at", add_poll_archived_at),
+]
+
+
+def _ensure_table(engine: Engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine: Engine) -> set:
+    _ensure_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine = None) -> List[int]:
+    """Apply every pending migration, each in its own transaction. Returns the versions applied."""
+    engine = engine or database.engine
+    done = applied_versions(engine)
+    applied = []
+    for version, name, upgrade in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                upgrade(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow()},
+                )
+        except IntegrityError:
+            # Another worker applied it first
+            continue
+        logger.info("Applied migration %d (%s)", version, name)
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv:
+        done = applied_versions(database.engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:4d} {name:30s} {'applied' if version in done else 'pending'}")
+        sys.exit(0)
+    applied = run_migrations()
+    names = {version: name for version, name, _ in MIGRATIONS}
+    for version in applied:
+        print(f"Applied migration {version} ({names[version]}).")
+    print(f"{len(applied)} migrations applied.")
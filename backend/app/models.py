@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum as SQLEnum, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum as SQLEnum, Text, UniqueConstraint, Index, LargeBinary
 from sqlalchemy.orm import relationship
 import enum
 import datetime
@@ -31,11 +31,15 @@ class Poll(Base):
     color_palette = Column(String, default="lehigh_soft") # lehigh_soft, vibrant, pastel, dark
     slide_duration = Column(Integer, default=3)
     enable_title_page = Column(Boolean, default=False)
+    archived_at = Column(DateTime, nullable=True) # Last compaction (see compaction.py)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="polls")
     questions = relationship("Question", back_populates="poll", cascade="all, delete-orphan")
 
+    # Index names match migrations.INDEXES, which adds them to existing databases
+    __table_args__ = (Index("ix_polls_active_created", "is_active", "created_at", "id"),)
+
 class Question(Base):
     __tablename__ = "questions"
     id = Column(Integer, primary_key=True, index=True)
@@ -48,6 +52,10 @@ class Question(Base):
     poll = relationship("Poll", back_populates="questions")
     options = relationship("Option", back_populates="question", cascade="all, delete-orphan")
     votes = relationship("Vote", back_populates="question", cascade="all, delete-orphan")
+    vote_counts = relationship("VoteCount", cascade="all, delete-orphan")
+    archive = relationship("QuestionArchive", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (Index("ix_questions_poll_order", "poll_id", "order"),)
 
 class Option(Base):
     __tablename__ = "options"
@@ -58,6 +66,8 @@ class Option(Base):
     question = relationship("Question", back_populates="options")
     votes = relationship("Vote", back_populates="option")
 
+    __table_args__ = (Index("ix_options_question", "question_id"),)
+
 class Vote(Base):
     __tablename__ = "votes"
     id = Column(Integer, primary_key=True, index=True)
@@ -65,6 +75,39 @@ class Vote(Base):
     option_id = Column(Integer, ForeignKey("options.id"), nullable=True)
     text_answer = Column(Text, nullable=True) # For open-ended
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Client idempotency key (see dedup.py); NULL for clients that do not send one
+    client_vote_id = Column(String, nullable=True)
 
     question = relationship("Question", back_populates="votes")
     option = relationship("Option", back_populates="votes")
+
+    __table_args__ = (
+        Index("ix_votes_question_option", "question_id", "option_id"),
+        Index("ix_votes_option", "option_id"),
+        Index("uq_votes_client_vote_id", "client_vote_id", unique=True),
+    )
+
+class VoteCount(Base):
+    # Running totals maintained alongside every vote insert (see vote_counts.py).
+    # option_id is NULL for votes without an option (open-ended answers).
+    __tablename__ = "vote_counts"
+    id = Column(Integer, primary_key=True, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
+    option_id = Column(Integer, ForeignKey("options.id"), nullable=True)
+    count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (UniqueConstraint("question_id", "option_id", name="uq_vote_counts_question_option"),)
+
+class QuestionArchive(Base):
+    # The votes of a compacted question (see compaction.py), which no longer have rows
+    # in `votes`. counts is JSON [[option_id, n], ...] over every archived vote;
+    # answers is the zlib-compressed JSON [[option_id, text_answer], ...] of the
+    # votes that carried a text answer.
+    __tablename__ = "question_archives"
+    id = Column(Integer, primary_key=True, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), unique=True, index=True)
+    vote_count = Column(Integer, default=0, nullable=False)
+    counts = Column(Text, default="[]", nullable=False)
+    answers = Column(LargeBinary, nullable=True)
+    last_vote_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
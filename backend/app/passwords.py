@@ -0,0 +1,121 @@
+"""
+Password hashing off the event loop.
+
+bcrypt takes a few hundred milliseconds per call by design. Called directly from an
+async endpoint it stalls every WebSocket served by the worker, so the async helpers
+below run it on a small dedicated thread pool. At most HASH_WORKERS hashes run at
+once and at most HASH_QUEUE_MAX wait behind them; beyond that callers get a 503
+rather than piling up.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# bcrypt cost factor; hashes made with a different cost are rehashed at next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads dedicated to hashing
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+# Hash requests allowed to wait for a thread
+HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+
+class HashPool:
+    def __init__(self, workers: int = HASH_WORKERS, max_queue: int = HASH_QUEUE_MAX):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        # Submitted and not finished (running + waiting)
+        self._pending = 0
+        self.stats = {
+            "completed": 0,
+            "rejected": 0,        # queue full
+            "rehashed": 0,
+            "max_queued": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "total_hash_ms": 0.0,
+        }
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.stats["rejected"] += 1
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server busy, please retry")
+            self._pending += 1
+            self.stats["max_queued"] = max(self.stats["max_queued"], self._pending - self.workers)
+        submitted = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, fn, submitted, args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _timed(self, fn, submitted: float, args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            wait_ms = (started - submitted) * 1000
+            with self._lock:
+                self.stats["completed"] += 1
+                self.stats["total_wait_ms"] += wait_ms
+                self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+                self.stats["total_hash_ms"] += (finished - started) * 1000
+
+    def count(self, stat: str, n: int = 1):
+        """Bump a counter about results only the caller sees (e.g. a rehash)."""
+        with self._lock:
+            self.stats[stat] += n
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            completed = self.stats["completed"]
+            return {
+                **self.stats,
+                "total_wait_ms": round(self.stats["total_wait_ms"], 2),
+                "max_wait_ms": round(self.stats["max_wait_ms"], 2),
+                "total_hash_ms": round(self.stats["total_hash_ms"], 2),
+                "workers": self.workers,
+                "rounds": BCRYPT_ROUNDS,
+                "in_flight": min(self._pending, self.workers),
+                "queued": max(self._pending - self.workers, 0),
+                "avg_wait_ms": round(self.stats["total_wait_ms"] / completed, 2) if completed else 0.0,
+                "avg_hash_ms": round(self.stats["total_hash_ms"] / completed, 2) if completed else 0.0,
+            }
+
+
+hash_pool = HashPool()
+
+
+async def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password on the hash pool. Returns (valid, new_hash); new_hash is set when
+    the stored hash was made with other settings (e.g. a changed BCRYPT_ROUNDS) and
+    should replace it.
+    """
+    valid, new_hash = await hash_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+    if new_hash:
+        hash_pool.count("rehashed")
+    return valid, new_hash
+
+
+async def hash_password(password: str) -> str:
+    return await hash_pool.run(pwd_context.hash, password)
@@ -0,0 +1,92 @@
+"""
+Opt-in per-request SQL profiling.
+
+With SQL_PROFILING=1 every HTTP response carries X-DB-Query-Count and X-DB-Time-Ms,
+and requests issuing more than SQL_QUERY_BUDGET statements are logged as warnings
+with their route, so lazy-loading regressions (N+1) show up before they get slow.
+
+Statements are counted by engine events on both the sync and the async engine. The
+current request's counters live in a context variable; sync endpoints run in the
+threadpool with a copy of the request context, which still points at the same
+RequestProfile, so their queries are counted too.
+"""
+import contextvars
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQL_PROFILING = os.getenv("SQL_PROFILING", "0").lower() in ("1", "true", "yes")
+# Statements per request above which a warning is logged
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "20"))
+
+
+class RequestProfile:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("sql_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    started = conn.info.get("profile_started")
+    if not started:
+        return
+    profile.queries += 1
+    profile.db_time += time.perf_counter() - started.pop()
+
+
+def instrument(engine):
+    """Attach the counters to a (sync) engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, budget: int = SQL_QUERY_BUDGET):
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = _current.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(profile.queries).encode()))
+                headers.append((b"x-db-time-ms", f"{profile.db_time * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", scope["path"])
+            if profile.queries > self.budget:
+                logger.warning(
+                    "Query budget exceeded: %s %s ran %d queries (budget %d) in %.1f ms",
+                    scope["method"], route, profile.queries, self.budget, profile.db_time * 1000,
+                )
+            else:
+                logger.debug("%s %s ran %d queries in %.1f ms", scope["method"], route, profile.queries, profile.db_time * 1000)
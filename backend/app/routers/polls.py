@@ -1,15 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Body, BackgroundTasks, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+import base64
+import json
+import logging
 import secrets
 from datetime import datetime
-from .. import models, schemas, database, auth
-from ..websockets import manager
+from .. import models, schemas, database, auth, vote_counts, export, serialization
+from ..websockets import scheduler, manager, encode_event
+from ..tally import tally_cache, tally_snapshot
+from ..snapshots import poll_snapshots
+from ..ingest import vote_writer
+from ..closer import close_scheduler
+from ..metrics import votes_total
+from ..dedup import dedup_key, recent_votes
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/polls", tags=["polls"])
 
 @router.post("/", response_model=schemas.Poll)
-def create_poll(poll: schemas.PollCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def create_poll(poll: schemas.PollCreate, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     slug = secrets.token_hex(3)
     while db.query(models.Poll).filter(models.Poll.slug == slug).first():
         slug = secrets.token_hex(3)
@@ -23,44 +39,172 @@ def create_poll(poll: schemas.PollCreate, db: Session = Depends(database.get_db)
     db.add(db_poll)
     db.commit()
     db.refresh(db_poll)
+    close_scheduler.schedule(db_poll.slug, db_poll.closes_at)
     return db_poll
 
-@router.get("/", response_model=List[schemas.Poll])
-def list_polls(active_only: bool = False, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    # 1. Auto-close check
-    now = datetime.utcnow()
-    active_polls = db.query(models.Poll).filter(models.Poll.is_active == True).all()
-    
-    for p in active_polls:
-        if p.closes_at and p.closes_at < now:
-            print(f"Auto-closing poll {p.slug} (Closes at: {p.closes_at}, Now: {now})")
-            p.is_active = False
-            p.closed_at = now
-    
-    db.commit()
+def _encode_cursor(poll) -> str:
+    return base64.urlsafe_b64encode(f"{poll.created_at.isoformat()}|{poll.id}".encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, poll_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(poll_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    # 2. Fetch sorted (Newest First)
-    # 2. Fetch sorted (Newest First) - GLOBAL ACCESS
-    query = db.query(models.Poll)
-    # query = db.query(models.Poll).filter(models.Poll.owner_id == current_user.id) # DISABLED FOR SHARED ACCESS
-    if active_only:
+@router.get("/", response_model=List[schemas.PollSummary])
+def list_polls(
+    status_filter: Optional[str] = Query(None, alias="status", pattern="^(active|closed)$"),
+    owner_id: Optional[int] = None,
+    active_only: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user),
+):
+    # Expired polls are closed by close_scheduler, so listing is a plain read.
+    # Summaries only: question and vote totals come from aggregate subqueries, the full
+    # poll is loaded by GET /polls/{slug}. Pages are keyed on (created_at, id), newest
+    # first; the next page's cursor is returned in the X-Next-Cursor header.
+    question_counts = (
+        select(models.Question.poll_id, func.count(models.Question.id).label("n"))
+        .group_by(models.Question.poll_id)
+        .subquery()
+    )
+    vote_totals = (
+        select(models.Question.poll_id, func.sum(models.VoteCount.count).label("n"))
+        .join(models.VoteCount, models.VoteCount.question_id == models.Question.id)
+        .group_by(models.Question.poll_id)
+        .subquery()
+    )
+    query = (
+        db.query(
+            models.Poll,
+            func.coalesce(question_counts.c.n, 0).label("question_count"),
+            func.coalesce(vote_totals.c.n, 0).label("total_votes"),
+        )
+        .outerjoin(question_counts, question_counts.c.poll_id == models.Poll.id)
+        .outerjoin(vote_totals, vote_totals.c.poll_id == models.Poll.id)
+    )
+    # GLOBAL ACCESS: every admin sees every poll unless owner_id is given
+    if owner_id is not None:
+        query = query.filter(models.Poll.owner_id == owner_id)
+    if active_only or status_filter == "active":
         query = query.filter(models.Poll.is_active == True)
-    
-    results = query.order_by(models.Poll.created_at.desc()).all()
-    print(f"DEBUG LIST_POLLS: UserID={current_user.id}, ActiveOnly={active_only}, Found={len(results)}")
-    for p in results:
-        print(f"  - Poll: {p.slug} (Owner: {p.owner_id}, Active: {p.is_active})")
-    return results
+    elif status_filter == "closed":
+        query = query.filter(models.Poll.is_active == False)
+    if cursor:
+        created_at, poll_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            models.Poll.created_at < created_at,
+            and_(models.Poll.created_at == created_at, models.Poll.id < poll_id),
+        ))
+
+    rows = query.order_by(models.Poll.created_at.desc(), models.Poll.id.desc()).limit(limit + 1).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1][0])
+    logger.debug("list_polls: user=%s status=%s found=%d", current_user.id, status_filter, len(rows))
+    return Response(content=serialization.summaries_json(rows), media_type="application/json", headers=headers)
 
 @router.get("/{slug}", response_model=schemas.Poll)
-def get_poll(slug: str, db: Session = Depends(database.get_db)):
+async def get_poll(slug: str, request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    # Serve from the snapshot cache; the version only moves when the poll is mutated
+    version = poll_snapshots.version(slug)
+    etag = poll_snapshots.etag(slug, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    # Compressed responses carry the weak form (W/"...") of the ETag
+    if etag in [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]:
+        poll_snapshots.stats["not_modified"] += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    body = poll_snapshots.get(slug, version)
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    # Load the whole tree up front; lazy loads are not available on an AsyncSession
+    result = await db.execute(
+        select(models.Poll)
+        .where(models.Poll.slug == slug)
+        .options(
+            selectinload(models.Poll.questions).selectinload(models.Question.options).selectinload(models.Option.votes),
+            selectinload(models.Poll.questions).selectinload(models.Question.votes),
+            selectinload(models.Poll.questions).selectinload(models.Question.archive),
+        )
+    )
+    poll = result.scalars().first()
+    if not poll:
+        raise HTTPException(status_code=404, detail="Poll not found")
+    body = serialization.poll_json(poll)
+    poll_snapshots.put(slug, version, body, poll.is_active)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/{slug}/results", response_model=schemas.PollResults)
+def get_results(slug: str, db: Session = Depends(database.get_db)):
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
     if not poll:
         raise HTTPException(status_code=404, detail="Poll not found")
-    return poll
+    return Response(content=serialization.dumps(tally_cache.get(slug, poll, db).to_dict(slug)), media_type="application/json")
+
+async def _event_stream(connection):
+    # Reconnect delay for EventSource, then the subscriber's queue
+    yield "retry: 3000\n\n"
+    async for event in connection.events():
+        yield event
+
+@router.get("/{slug}/stream")
+async def stream_poll(slug: str, request: Request, last_event_id: Optional[str] = None):
+    """
+    Server-Sent Events for read-only displays: the same frames as /ws/{slug}, from
+    the same broadcast. A reconnecting client (EventSource sends Last-Event-ID by
+    itself; the query parameter is for clients that reconnect by hand) gets the
+    events it missed if the replay buffer still holds them, otherwise a snapshot.
+    A version gap in the tally frames is resolved with GET /polls/{slug}/results.
+    """
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    connection, resumed = manager.subscribe_stream(slug, resume_from)
+    if connection is None:
+        return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "10"})
+    if not resumed:
+        # Events logged from here on may already be in the snapshot; on resume they are replayed and ignored by version
+        snapshot_id = manager.replay.last_id(slug)
+        snapshot = await run_in_threadpool(tally_snapshot, slug)
+        if snapshot is None:
+            manager.disconnect(connection)
+            manager.replay.discard(slug)
+            raise HTTPException(status_code=404, detail="Poll not found")
+        connection.prepend("snapshot", encode_event(json.dumps(snapshot), snapshot_id))
+    return StreamingResponse(
+        _event_stream(connection),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx passes each event on instead of buffering the response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/{slug}/export.csv")
+def export_csv(slug: str, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
+    poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
+    if not poll:
+        raise HTTPException(status_code=404, detail="Poll not found")
+    return StreamingResponse(
+        export.iter_csv(poll.id),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{slug}.csv"'},
+    )
+
+@router.get("/{slug}/export.ndjson")
+def export_ndjson(slug: str, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
+    poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
+    if not poll:
+        raise HTTPException(status_code=404, detail="Poll not found")
+    return StreamingResponse(
+        export.iter_ndjson(poll.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{slug}.ndjson"'},
+    )
 
 @router.put("/{slug}", response_model=schemas.Poll)
-def update_poll(slug: str, poll_update: schemas.PollUpdate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def update_poll(slug: str, poll_update: schemas.PollUpdate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # poll = db.query(models.Poll).filter(models.Poll.slug == slug, models.Poll.owner_id == current_user.id).first()
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
     if not poll:
@@ -87,11 +231,18 @@ def update_poll(slug: str, poll_update: schemas.PollUpdate, background_tasks: Ba
     db.commit()
     db.refresh(poll)
     db.refresh(poll)
-    background_tasks.add_task(manager.broadcast, {"event": "update", "poll_id": poll.id}, slug)
+    if "closes_at" in update_data or "is_active" in update_data:
+        # Reopening restores the deadline; closing (or clearing it) drops it
+        if poll.is_active:
+            close_scheduler.schedule(slug, poll.closes_at)
+        else:
+            close_scheduler.cancel(slug)
+    poll_snapshots.bump(slug)
+    background_tasks.add_task(scheduler.publish, {"event": "update", "poll_id": poll.id}, slug)
     return poll
 
 @router.put("/{slug}/close", response_model=schemas.Poll)
-def close_poll(slug: str, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def close_poll(slug: str, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # poll = db.query(models.Poll).filter(models.Poll.slug == slug, models.Poll.owner_id == current_user.id).first()
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
     if not poll:
@@ -101,11 +252,13 @@ def close_poll(slug: str, background_tasks: BackgroundTasks, db: Session = Depen
     db.commit()
     db.refresh(poll)
     db.refresh(poll)
-    background_tasks.add_task(manager.broadcast, {"event": "update", "poll_id": poll.id}, slug)
+    close_scheduler.cancel(slug)
+    poll_snapshots.bump(slug)
+    background_tasks.add_task(scheduler.publish, {"event": "update", "poll_id": poll.id}, slug)
     return poll
 
 @router.put("/{slug}/open", response_model=schemas.Poll)
-def reopen_poll(slug: str, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def reopen_poll(slug: str, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # poll = db.query(models.Poll).filter(models.Poll.slug == slug, models.Poll.owner_id == current_user.id).first()
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
     if not poll:
@@ -115,11 +268,13 @@ def reopen_poll(slug: str, background_tasks: BackgroundTasks, db: Session = Depe
     db.commit()
     db.refresh(poll)
     db.refresh(poll)
-    background_tasks.add_task(manager.broadcast, {"event": "update", "poll_id": poll.id}, slug)
+    close_scheduler.schedule(slug, poll.closes_at)
+    poll_snapshots.bump(slug)
+    background_tasks.add_task(scheduler.publish, {"event": "update", "poll_id": poll.id}, slug)
     return poll
 
 @router.post("/{slug}/questions", response_model=schemas.Question)
-def add_question(slug: str, question: schemas.QuestionCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def add_question(slug: str, question: schemas.QuestionCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # poll = db.query(models.Poll).filter(models.Poll.slug == slug, models.Poll.owner_id == current_user.id).first()
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
     if not poll:
@@ -147,11 +302,13 @@ def add_question(slug: str, question: schemas.QuestionCreate, background_tasks:
     db.commit()
     db.refresh(db_question)
     db.refresh(db_question)
-    background_tasks.add_task(manager.broadcast, {"event": "update", "poll_id": poll.id}, slug)
+    tally_cache.invalidate(slug)
+    poll_snapshots.bump(slug)
+    background_tasks.add_task(scheduler.publish, {"event": "update", "poll_id": poll.id}, slug)
     return db_question
 
 @router.delete("/{slug}/questions/{question_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_question(slug: str, question_id: int, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def delete_question(slug: str, question_id: int, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # poll = db.query(models.Poll).filter(models.Poll.slug == slug, models.Poll.owner_id == current_user.id).first()
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
     if not poll:
@@ -165,11 +322,13 @@ def delete_question(slug: str, question_id: int, background_tasks: BackgroundTas
     db.commit()
     db.delete(question)
     db.commit()
-    background_tasks.add_task(manager.broadcast, {"event": "update", "poll_id": poll.id}, slug)
+    tally_cache.invalidate(slug)
+    poll_snapshots.bump(slug)
+    background_tasks.add_task(scheduler.publish, {"event": "update", "poll_id": poll.id}, slug)
     return None
 
 @router.put("/{slug}/questions/reorder")
-def reorder_questions(slug: str, ordered_ids: List[int] = Body(...), background_tasks: BackgroundTasks = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def reorder_questions(slug: str, ordered_ids: List[int] = Body(...), background_tasks: BackgroundTasks = None, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # Note: background_tasks=None default because Body(...) comes before it in arg list sometimes causing issues if fastAPI order matters, 
     # but actually FastAPI is smart. Let's strictly type it.
     pass 
@@ -191,12 +350,13 @@ def reorder_questions(slug: str, ordered_ids: List[int] = Body(...), background_
     db.commit()
             
     db.commit()
+    poll_snapshots.bump(slug)
     if background_tasks:
-        background_tasks.add_task(manager.broadcast, {"event": "update", "poll_id": poll.id}, slug)
+        background_tasks.add_task(scheduler.publish, {"event": "update", "poll_id": poll.id}, slug)
     return {"status": "success"}
 
 @router.put("/{slug}/questions/{question_id}", response_model=schemas.Question)
-def update_question(slug: str, question_id: int, question_update: schemas.QuestionCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def update_question(slug: str, question_id: int, question_update: schemas.QuestionCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # Verify poll ownership
     # poll = db.query(models.Poll).filter(models.Poll.slug == slug, models.Poll.owner_id == current_user.id).first()
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
@@ -233,40 +393,161 @@ def update_question(slug: str, question_id: int, question_update: schemas.Questi
             db.add(new_opt)
             
     # 4. Delete removed options
-    for opt in existing_options:
-        if opt.id not in kept_ids:
-            db.delete(opt)
+    removed = [opt for opt in existing_options if opt.id not in kept_ids]
+    for opt in removed:
+        db.delete(opt)
+
+    # 5. Votes for removed options lose their option; recount the question
+    if removed:
+        db.flush()
+        vote_counts.rebuild_question(db, db_question.id)
 
     db.commit()
     db.refresh(db_question)
     db.refresh(db_question)
-    background_tasks.add_task(manager.broadcast, {"event": "update", "poll_id": poll.id}, slug)
+    tally_cache.invalidate(slug)
+    poll_snapshots.bump(slug)
+    background_tasks.add_task(scheduler.publish, {"event": "update", "poll_id": poll.id}, slug)
     return db_question
 
-@router.post("/{slug}/vote")
-async def submit_vote(slug: str, vote: schemas.VoteCreate, db: Session = Depends(database.get_db)):
-    poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
+async def _open_poll(slug: str, db: AsyncSession) -> models.Poll:
+    poll = (await db.execute(select(models.Poll).where(models.Poll.slug == slug))).scalars().first()
     if not poll or not poll.is_active:
          raise HTTPException(status_code=400, detail="Poll is closed or invalid")
     
-    # Extra check if auto-close wasn't triggered by listing yet
+    # close_scheduler closes the poll at its deadline; this covers the moment in between
+    # (and polls whose deadline passed while the server was down, until startup catches up)
     if poll.closes_at and poll.closes_at < datetime.utcnow():
         raise HTTPException(status_code=400, detail="Poll has expired")
+    return poll
 
-    db_vote = models.Vote(question_id=vote.question_id, option_id=vote.option_id, text_answer=vote.text_answer)
-    db.add(db_vote)
-    db.commit()
-    db.refresh(db_vote)
-    
-    # Broadcast update
-    # For simplicity, sending a signal to refetch or sending the vote itself.
-    # Ideally we act as aggregators. sending {"event": "new_vote", "poll_id": poll.id}
-    await manager.broadcast({"event": "update", "poll_id": poll.id}, slug)
+def _validate_answer(tally, question_id: int, option_id: Optional[int]):
+    # Validated against the cached tally instead of querying questions/options per vote
+    if question_id not in tally.questions:
+        raise HTTPException(status_code=400, detail="Invalid question")
+    if option_id is not None and tally.option_question.get(option_id) != question_id:
+        raise HTTPException(status_code=400, detail="Invalid option")
+
+async def _store_votes(slug: str, poll: models.Poll, tally, votes: list, db: AsyncSession) -> list:
+    """
+    Write validated (question_id, option_id, text_answer, client_vote_id) votes in one
+    transaction and broadcast them as one frame. Returns the votes actually stored;
+    votes whose key turns out to be stored already are left out. Every key must have
+    been claimed from `recent_votes`; each is confirmed or forgotten here.
+    """
+    if vote_writer.enabled:
+        # Write-behind: acknowledge now, the background writer commits them with the next batch
+        if not vote_writer.submit_many(slug, votes):
+            for vote in votes:
+                if vote[3]:
+                    recent_votes.forget(vote[3])
+            votes_total.inc("write_behind", "rejected", n=len(votes))
+            raise HTTPException(status_code=503, detail="Too many votes in flight, please retry")
+        votes_total.inc("write_behind", "accepted", n=len(votes))
+        for vote in votes:
+            if vote[3]:
+                recent_votes.confirm(vote[3])
+    else:
+        try:
+            for attempt in range(2):
+                counts = {}
+                for question_id, option_id, text_answer, key in votes:
+                    db.add(models.Vote(question_id=question_id, option_id=option_id, text_answer=text_answer, client_vote_id=key))
+                    counts[(question_id, option_id)] = counts.get((question_id, option_id), 0) + 1
+                try:
+                    await vote_counts.add_votes_async(db, counts)
+                    await db.commit()
+                    break
+                except IntegrityError:
+                    # A retry from beyond the in-memory dedup window: drop what is already stored
+                    await db.rollback()
+                    keys = [vote[3] for vote in votes if vote[3]]
+                    if not keys or attempt:
+                        raise
+                    stored = set((await db.execute(select(models.Vote.client_vote_id).where(models.Vote.client_vote_id.in_(keys)))).scalars())
+                    votes_total.inc("sync", "duplicate", n=len(stored))
+                    for key in stored:
+                        recent_votes.confirm(key)
+                    votes = [vote for vote in votes if vote[3] not in stored]
+                    if not votes:
+                        return []
+        except BaseException:
+            # Not stored (cancellation included): release the reserved keys so a retry is accepted
+            for vote in votes:
+                if vote[3]:
+                    recent_votes.forget(vote[3])
+            raise
+        for vote in votes:
+            if vote[3]:
+                recent_votes.confirm(vote[3])
+        votes_total.inc("sync", "accepted", n=len(votes))
+    delta = tally_cache.record_votes(slug, tally, [(q, o, t) for q, o, t, _ in votes])
+    poll_snapshots.bump(slug)
     
+    # Broadcast the changed counts so displays can apply them without refetching.
+    # If the tally was rebuilt underneath us, fall back to asking clients to refetch.
+    if delta:
+        await scheduler.publish({"event": "tally", "poll_id": poll.id, **delta}, slug)
+    else:
+        await scheduler.publish({"event": "update", "poll_id": poll.id}, slug)
+    return votes
+
+@router.post("/{slug}/vote")
+async def submit_vote(slug: str, vote: schemas.VoteCreate, db: AsyncSession = Depends(database.get_async_db)):
+    poll = await _open_poll(slug, db)
+    tally = await tally_cache.get_async(slug, poll, db)
+    _validate_answer(tally, vote.question_id, vote.option_id)
+
+    # Retried submissions: recent ids are caught in memory, older ones by the unique index.
+    # A retry racing the first attempt waits for it to be stored (or to fail)
+    key = dedup_key(vote.vote_id, vote.participant_id)
+    if key and not await recent_votes.claim(key):
+        votes_total.inc("write_behind" if vote_writer.enabled else "sync", "duplicate")
+        return {"status": "duplicate"}
+
+    if not await _store_votes(slug, poll, tally, [(vote.question_id, vote.option_id, vote.text_answer, key)], db):
+        return {"status": "duplicate"}
     return {"status": "success"}
 
+@router.post("/{slug}/ballot")
+async def submit_ballot(slug: str, ballot: schemas.BallotCreate, db: AsyncSession = Depends(database.get_async_db)):
+    """Answers to several questions of one poll: one validation pass, one transaction, one broadcast."""
+    poll = await _open_poll(slug, db)
+    tally = await tally_cache.get_async(slug, poll, db)
+    if not ballot.answers:
+        raise HTTPException(status_code=400, detail="Ballot has no answers")
+    if len({answer.question_id for answer in ballot.answers}) != len(ballot.answers):
+        raise HTTPException(status_code=400, detail="Ballot answers a question more than once")
+    for answer in ballot.answers:
+        _validate_answer(tally, answer.question_id, answer.option_id)
+
+    # Per-answer keys match what the single-vote endpoint gets for vote_id "<ballot_id>:<question_id>"
+    answers = [
+        (answer, dedup_key(f"{ballot.ballot_id}:{answer.question_id}" if ballot.ballot_id else None, ballot.participant_id))
+        for answer in ballot.answers
+    ]
+    # Claimed in a fixed order, so two retries of a ballot never wait on each other
+    claimed = set()
+    try:
+        for key in sorted(key for _, key in answers if key):
+            if await recent_votes.claim(key):
+                claimed.add(key)
+    except BaseException:
+        for key in claimed:
+            recent_votes.forget(key)
+        raise
+    votes = [(answer.question_id, answer.option_id, answer.text_answer, key) for answer, key in answers if key is None or key in claimed]
+    duplicates = len(answers) - len(votes)
+    if duplicates:
+        votes_total.inc("write_behind" if vote_writer.enabled else "sync", "duplicate", n=duplicates)
+
+    stored = await _store_votes(slug, poll, tally, votes, db) if votes else []
+    if not stored:
+        return {"status": "duplicate", "accepted": 0, "duplicates": len(ballot.answers)}
+    return {"status": "success", "accepted": len(stored), "duplicates": len(ballot.answers) - len(stored)}
+
 @router.delete("/{slug}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_poll(slug: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def delete_poll(slug: str, db: Session = Depends(database.get_db), current_user: auth.Principal = Depends(auth.get_current_user)):
     # poll = db.query(models.Poll).filter(models.Poll.slug == slug, models.Poll.owner_id == current_user.id).first()
     poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
     if not poll:
@@ -274,5 +555,8 @@ def delete_poll(slug: str, db: Session = Depends(database.get_db), current_user:
     
     db.delete(poll)
     db.commit()
+    close_scheduler.cancel(slug)
+    tally_cache.drop(slug)
+    poll_snapshots.bump(slug)
     return None
 
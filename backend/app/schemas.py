@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from .models import QuestionType
 
@@ -82,6 +82,24 @@ class Poll(BaseModel):
             datetime: lambda v: v.isoformat() + 'Z' if v.tzinfo is None else v.isoformat()
         }
 
+class PollSummary(BaseModel):
+    """One row of the dashboard listing: no questions, just aggregates."""
+    id: int
+    title: str
+    slug: str
+    owner_id: int
+    created_at: datetime
+    closes_at: Optional[datetime]
+    closed_at: Optional[datetime]
+    is_active: bool
+    question_count: int
+    total_votes: int
+    class Config:
+        orm_mode = True
+        json_encoders = {
+            datetime: lambda v: v.isoformat() + 'Z' if v.tzinfo is None else v.isoformat()
+        }
+
 class UserBase(BaseModel):
     username: str
 
@@ -109,4 +127,31 @@ class VoteCreate(BaseModel):
     question_id: int
     option_id: Optional[int] = None
     text_answer: Optional[str] = None
+    # Idempotency key chosen by the client; resending the same id is answered with "duplicate"
+    vote_id: Optional[str] = Field(None, max_length=64)
+    # Optional stable id of the voter; vote ids only need to be unique per participant
+    participant_id: Optional[str] = Field(None, max_length=64)
+
+class BallotAnswer(BaseModel):
+    question_id: int
+    option_id: Optional[int] = None
+    text_answer: Optional[str] = None
+
+class BallotCreate(BaseModel):
+    answers: List[BallotAnswer] = Field(..., max_length=200)
+    # Idempotency key for the whole ballot; each answer is stored as "<ballot_id>:<question_id>"
+    ballot_id: Optional[str] = Field(None, max_length=40)
+    participant_id: Optional[str] = Field(None, max_length=64)
+
+class PollResults(BaseModel):
+    poll_id: int
+    slug: str
+    version: int
+    total_votes: int
+    # question_id -> total votes
+    questions: Dict[int, int] = {}
+    # option_id -> votes
+    options: Dict[int, int] = {}
+    # open-ended question_id -> top [term, count] pairs, most frequent first
+    terms: Dict[int, List[Tuple[str, int]]] = {}
 
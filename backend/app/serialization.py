@@ -0,0 +1,111 @@
+"""
+JSON fast path for the hot read endpoints.
+
+The default FastAPI path validates an endpoint's return value against its response
+model and then encodes it with the stdlib encoder. The poll tree, the results and
+the dashboard listing are built from rows we just read (or from the tally cache),
+so these endpoints skip validation and encode plain dicts with orjson instead. The
+response models stay on the routes for documentation.
+
+The output is byte-for-byte what the models produced: same field order, compact
+separators, and the "Z" suffix that `schemas.Poll` and `schemas.PollSummary` add
+to their own datetimes (the nested vote timestamps never had it). The dict
+builders below mirror those schemas, so a field added there must be added here
+too; `python bench_serialization.py` checks that both paths still agree.
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import orjson
+
+from . import models
+from .compaction import archived_votes
+
+
+def utc_z(value: Optional[datetime]) -> Optional[str]:
+    """Same as the json_encoders entry of schemas.Poll: naive datetimes are UTC."""
+    if value is None:
+        return None
+    return value.isoformat() + "Z" if value.tzinfo is None else value.isoformat()
+
+
+def dumps(content) -> bytes:
+    # Tally dicts are keyed by integer ids
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _vote(vote: models.Vote) -> dict:
+    return {
+        "id": vote.id,
+        "question_id": vote.question_id,
+        "option_id": vote.option_id,
+        "text_answer": vote.text_answer,
+        "created_at": vote.created_at,
+    }
+
+
+def _question(question: models.Question) -> dict:
+    votes = [_vote(vote) for vote in question.votes]
+    option_votes = {option.id: [_vote(vote) for vote in option.votes] for option in question.options}
+    if question.archive is not None:
+        # Compacted question: put the archived votes back where their rows used to be
+        # (one pass; the response embeds every vote, so the lists are as long as the body needs)
+        archived = []
+        archived_by_option = {option_id: [] for option_id in option_votes}
+        for vote in archived_votes(question.archive, set(option_votes)):
+            archived.append(vote)
+            if vote["option_id"] in archived_by_option:
+                archived_by_option[vote["option_id"]].append(vote)
+        votes = archived + votes
+        for option_id, option_archived in archived_by_option.items():
+            option_votes[option_id] = option_archived + option_votes[option_id]
+    return {
+        "text": question.text,
+        "question_type": question.question_type,
+        "visualization_type": question.visualization_type,
+        "id": question.id,
+        "poll_id": question.poll_id,
+        "order": question.order,
+        "options": [
+            {"text": option.text, "id": option.id, "question_id": option.question_id, "votes": option_votes[option.id]}
+            for option in question.options
+        ],
+        "votes": votes,
+    }
+
+
+def poll_json(poll: models.Poll) -> bytes:
+    """`GET /polls/{slug}` body (schemas.Poll) for a poll loaded with its questions, options, votes and archives."""
+    return dumps({
+        "id": poll.id,
+        "title": poll.title,
+        "slug": poll.slug,
+        "owner_id": poll.owner_id,
+        "created_at": utc_z(poll.created_at),
+        "closes_at": utc_z(poll.closes_at),
+        "color_palette": poll.color_palette,
+        "slide_duration": poll.slide_duration,
+        "enable_title_page": poll.enable_title_page,
+        "is_active": poll.is_active,
+        "questions": [_question(question) for question in poll.questions],
+    })
+
+
+def summaries_json(rows: Iterable[tuple]) -> bytes:
+    """`GET /polls/` body (List[schemas.PollSummary]) from (poll, question_count, total_votes) rows."""
+    summaries: List[dict] = [
+        {
+            "id": poll.id,
+            "title": poll.title,
+            "slug": poll.slug,
+            "owner_id": poll.owner_id,
+            "created_at": utc_z(poll.created_at),
+            "closes_at": utc_z(poll.closes_at),
+            "closed_at": utc_z(poll.closed_at),
+            "is_active": poll.is_active,
+            "question_count": question_count,
+            "total_votes": total_votes,
+        }
+        for poll, question_count, total_votes in rows
+    ]
+    return dumps(summaries)
@@ -0,0 +1,99 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Most poll snapshots kept in memory
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "256"))
+# Snapshots not read for this long are dropped (seconds)
+SNAPSHOT_IDLE_SECONDS = int(os.getenv("SNAPSHOT_IDLE_SECONDS", "900"))
+
+# Versions restart with the process, so ETags carry a per-process tag as well
+_EPOCH = secrets.token_hex(4)
+
+
+class PollSnapshot:
+    def __init__(self, version: int, body: bytes, is_active: bool):
+        self.version = version
+        self.body = body
+        self.is_active = is_active
+        self.last_access = time.monotonic()
+
+
+class PollSnapshotCache:
+    """
+    Serialized `GET /polls/{slug}` responses, keyed by slug.
+
+    Every mutation of a poll calls `bump`, which moves the slug to a new version and
+    drops the stored bytes. The version doubles as the ETag, so clients holding the
+    current one get a 304 without the poll being loaded at all.
+
+    Entries are evicted least-recently-used first; closed polls are placed at the
+    cold end and entries idle for SNAPSHOT_IDLE_SECONDS are dropped.
+    """
+
+    def __init__(self, max_entries: int = SNAPSHOT_CACHE_SIZE, idle_seconds: int = SNAPSHOT_IDLE_SECONDS):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._entries: "OrderedDict[str, PollSnapshot]" = OrderedDict()
+        # slug -> version; kept after eviction so a version is never reused
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+    def version(self, slug: str) -> int:
+        return self._versions.get(slug, 0)
+
+    def etag(self, slug: str, version: int) -> str:
+        return f'"{slug}-{_EPOCH}-{version}"'
+
+    def get(self, slug: str, version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is None or entry.version != version:
+                self.stats["misses"] += 1
+                return None
+            entry.last_access = time.monotonic()
+            if entry.is_active:
+                self._entries.move_to_end(slug)
+            self.stats["hits"] += 1
+            return entry.body
+
+    def put(self, slug: str, version: int, body: bytes, is_active: bool):
+        with self._lock:
+            if self._versions.get(slug, 0) != version:
+                # Changed while we were building it
+                return
+            self._entries[slug] = PollSnapshot(version, body, is_active)
+            if is_active:
+                self._entries.move_to_end(slug)
+            else:
+                self._entries.move_to_end(slug, last=False)
+            self._prune()
+
+    def bump(self, slug: str):
+        with self._lock:
+            self._versions[slug] = self._versions.get(slug, 0) + 1
+            self._entries.pop(slug, None)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for slug in [s for s, e in self._entries.items() if e.last_access < cutoff]:
+            del self._entries[slug]
+            self.stats["evictions"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": sum(len(e.body) for e in self._entries.values()),
+            }
+
+
+poll_snapshots = PollSnapshotCache()
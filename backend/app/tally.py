@@ -0,0 +1,384 @@
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models, database
+from .compaction import iter_answers
+from .wordfreq import HeavyHitters
+
+
+class PollTally:
+    """Vote counts for a single poll, kept in memory."""
+
+    def __init__(self, poll_id: int):
+        self.poll_id = poll_id
+        self.version = 0
+        self.loaded = False
+        # question_id -> total votes
+        self.questions: Dict[int, int] = {}
+        # option_id -> votes
+        self.options: Dict[int, int] = {}
+        # option_id -> question_id (used to validate incoming votes)
+        self.option_question: Dict[int, int] = {}
+        # open-ended question_id -> term frequencies of its answers
+        self.terms: Dict[int, HeavyHitters] = {}
+
+    def total_votes(self) -> int:
+        return sum(self.questions.values())
+
+    def add_answer(self, question_id: int, text: Optional[str], n: int = 1) -> bool:
+        """Feed an open-ended answer into the question's term counts. Returns True if it applied."""
+        hitters = self.terms.get(question_id)
+        if hitters is None or not text:
+            return False
+        hitters.add_text(text, n)
+        return True
+
+    def to_dict(self, slug: str) -> dict:
+        return {
+            "poll_id": self.poll_id,
+            "slug": slug,
+            "version": self.version,
+            "total_votes": self.total_votes(),
+            "questions": dict(self.questions),
+            "options": dict(self.options),
+            "terms": {q_id: hitters.top() for q_id, hitters in self.terms.items()},
+        }
+
+
+def _tally_queries(poll_id: int):
+    """Questions, options and vote counts for a poll (run on a sync or async session)."""
+    questions = select(models.Question.id, models.Question.question_type).where(models.Question.poll_id == poll_id)
+    options = (
+        select(models.Option.id, models.Option.question_id)
+        .join(models.Question, models.Option.question_id == models.Question.id)
+        .where(models.Question.poll_id == poll_id)
+    )
+    # Read the maintained rollup (one row per option) rather than counting votes
+    counts = (
+        select(models.VoteCount.question_id, models.VoteCount.option_id, func.sum(models.VoteCount.count))
+        .join(models.Question, models.VoteCount.question_id == models.Question.id)
+        .where(models.Question.poll_id == poll_id)
+        .group_by(models.VoteCount.question_id, models.VoteCount.option_id)
+    )
+    return questions, options, counts
+
+
+def _answers_query(poll_id: int):
+    """Text answers of the poll's open-ended questions, streamed once when a tally is built."""
+    return (
+        select(models.Vote.question_id, models.Vote.text_answer)
+        .join(models.Question, models.Vote.question_id == models.Question.id)
+        .where(
+            models.Question.poll_id == poll_id,
+            models.Question.question_type == models.QuestionType.OPEN_ENDED,
+            models.Vote.text_answer.isnot(None),
+        )
+        .execution_options(yield_per=1000)
+    )
+
+
+def _archives_query(poll_id: int):
+    """Compressed answers of the poll's compacted open-ended questions."""
+    return (
+        select(models.QuestionArchive.question_id, models.QuestionArchive.answers)
+        .join(models.Question, models.QuestionArchive.question_id == models.Question.id)
+        .where(
+            models.Question.poll_id == poll_id,
+            models.Question.question_type == models.QuestionType.OPEN_ENDED,
+            models.QuestionArchive.answers.isnot(None),
+        )
+    )
+
+
+def _add_archived_answers(tally: PollTally, question_id: int, blob: bytes):
+    for text, n in Counter(text for _, text in iter_answers(blob)).items():
+        tally.add_answer(question_id, text, n)
+
+
+def _build(poll_id: int, questions, options, counts) -> PollTally:
+    tally = PollTally(poll_id)
+    tally.loaded = True
+    for q_id, question_type in questions:
+        tally.questions[q_id] = 0
+        if question_type == models.QuestionType.OPEN_ENDED:
+            tally.terms[q_id] = HeavyHitters()
+    for opt_id, q_id in options:
+        tally.options[opt_id] = 0
+        tally.option_question[opt_id] = q_id
+    for q_id, opt_id, count in counts:
+        tally.questions[q_id] = tally.questions.get(q_id, 0) + count
+        if opt_id in tally.options:
+            tally.options[opt_id] += count
+    return tally
+
+
+class TallyCache:
+    """
+    Per-slug vote tallies.
+
+    A tally is built from the database the first time it is needed and is then
+    kept current by `record_vote`. Structural changes (questions or options added,
+    edited or removed) call `invalidate`, and the next read rebuilds the tally.
+    """
+
+    def __init__(self):
+        self._tallies: Dict[str, PollTally] = {}
+        # slug -> number of votes recorded, used to detect votes landing during a rebuild
+        self._writes: Dict[str, int] = {}
+        # slug -> {(question_id, option_id): votes accepted but not yet written (write-behind ingestion)}
+        self._pending: Dict[str, Dict[Tuple[int, Optional[int]], int]] = {}
+        # slug -> {(question_id, text_answer): count} for the same pending votes
+        self._pending_answers: Dict[str, Dict[Tuple[int, str], int]] = {}
+        # slug -> batches of its pending votes currently being committed
+        self._flushing: Dict[str, int] = {}
+        # Sync endpoints run in the threadpool, submit_vote runs on the event loop
+        self._lock = threading.Lock()
+
+    def get(self, slug: str, poll: models.Poll, db: Session) -> PollTally:
+        tally = None
+        for _ in range(3):
+            current, writes = self._lookup(slug, poll)
+            if current is not None:
+                return current
+            tally = _build(poll.id, *[db.execute(stmt).all() for stmt in _tally_queries(poll.id)])
+            if tally.terms:
+                for q_id, text in db.execute(_answers_query(poll.id)):
+                    tally.add_answer(q_id, text)
+                for q_id, blob in db.execute(_archives_query(poll.id)):
+                    _add_archived_answers(tally, q_id, blob)
+            if self._install(slug, tally, writes):
+                return tally
+        # Busy poll: serve the latest read without installing it
+        return tally
+
+    async def get_async(self, slug: str, poll: models.Poll, db: AsyncSession) -> PollTally:
+        """Same as `get`, for endpoints running on an AsyncSession."""
+        tally = None
+        for _ in range(3):
+            current, writes = self._lookup(slug, poll)
+            if current is not None:
+                return current
+            rows = [(await db.execute(stmt)).all() for stmt in _tally_queries(poll.id)]
+            tally = _build(poll.id, *rows)
+            if tally.terms:
+                async for q_id, text in await db.stream(_answers_query(poll.id)):
+                    tally.add_answer(q_id, text)
+                for q_id, blob in await db.execute(_archives_query(poll.id)):
+                    _add_archived_answers(tally, q_id, blob)
+            if self._install(slug, tally, writes):
+                return tally
+        return tally
+
+    def _lookup(self, slug: str, poll: models.Poll):
+        with self._lock:
+            current = self._tallies.get(slug)
+            if current is not None and current.loaded and current.poll_id == poll.id:
+                return current, None
+            return None, self._writes.get(slug, 0)
+
+    def _install(self, slug: str, tally: PollTally, writes: int) -> bool:
+        with self._lock:
+            if self._writes.get(slug, 0) != writes or self._flushing.get(slug):
+                # A vote was recorded while we were reading, or a batch may have committed
+                # votes that are still in the pending counts; the snapshot may be stale
+                return False
+            # Votes already acknowledged but still queued for the database
+            for (q_id, opt_id), count in self._pending.get(slug, {}).items():
+                if q_id in tally.questions:
+                    tally.questions[q_id] += count
+                if opt_id in tally.options:
+                    tally.options[opt_id] += count
+            for (q_id, text), count in self._pending_answers.get(slug, {}).items():
+                tally.add_answer(q_id, text, count)
+            current = self._tallies.get(slug)
+            if current is not None and current.poll_id == tally.poll_id:
+                # Keep the version moving forward across rebuilds so clients notice the change
+                tally.version = current.version + 1
+            self._tallies[slug] = tally
+            return True
+
+    def record_vote(self, slug: str, tally: PollTally, question_id: int, option_id: Optional[int], text_answer: Optional[str] = None) -> Optional[dict]:
+        """
+        Apply a committed vote to the tally it was validated against.
+
+        Returns the changed counts as absolute values together with the version
+        they apply on top of (`base`) and the resulting `version`, or None if that
+        tally has since been replaced or invalidated (the vote is then picked up
+        by the next rebuild).
+        """
+        return self.record_votes(slug, tally, [(question_id, option_id, text_answer)])
+
+    def record_votes(self, slug: str, tally: PollTally, votes: Iterable[Tuple[int, Optional[int], Optional[str]]]) -> Optional[dict]:
+        """Same as `record_vote` for several (question_id, option_id, text_answer) votes, as one version step."""
+        votes = list(votes)
+        with self._lock:
+            self._writes[slug] = self._writes.get(slug, 0) + 1
+            current = self._tallies.get(slug)
+            if current is not tally or not tally.loaded:
+                if current is not None:
+                    current.loaded = False
+                return None
+            tally.version += 1
+            added_questions: Dict[int, int] = {}
+            added_options: Dict[int, int] = {}
+            answers: Dict[int, list] = {}
+            for question_id, option_id, text_answer in votes:
+                tally.questions[question_id] = tally.questions.get(question_id, 0) + 1
+                added_questions[question_id] = added_questions.get(question_id, 0) + 1
+                if option_id is not None and option_id in tally.options:
+                    tally.options[option_id] += 1
+                    added_options[option_id] = added_options.get(option_id, 0) + 1
+                if text_answer:
+                    answers.setdefault(question_id, []).append(text_answer)
+            delta = {
+                "base": tally.version - 1,
+                "version": tally.version,
+                "questions": {q_id: tally.questions[q_id] for q_id in added_questions},
+                "options": {o_id: tally.options[o_id] for o_id in added_options},
+                # Increments behind the counts above, so other workers can apply the same change
+                "added": {"questions": added_questions, "options": added_options},
+            }
+            if answers:
+                delta["answers"] = answers
+                terms = {}
+                for question_id, texts in answers.items():
+                    for text in texts:
+                        tally.add_answer(question_id, text)
+                    if question_id in tally.terms:
+                        terms[question_id] = tally.terms[question_id].top()
+                if terms:
+                    delta["terms"] = terms
+            return delta
+
+    def apply_remote(self, slug: str, frame: dict) -> Optional[dict]:
+        """
+        Apply a tally frame produced by another worker to this worker's tally.
+
+        Counts and versions are per worker, so only the frame's increments are used,
+        and a new frame is returned with this worker's absolute counts and versions.
+        Returns None if there is no loaded tally here (the next read rebuilds it).
+        """
+        added = frame.get("added") or {}
+        question_inc = {int(k): v for k, v in (added.get("questions") or {}).items()}
+        option_inc = {int(k): v for k, v in (added.get("options") or {}).items()}
+        with self._lock:
+            self._writes[slug] = self._writes.get(slug, 0) + 1
+            tally = self._tallies.get(slug)
+            if tally is None or not tally.loaded:
+                return None
+            if any(q_id not in tally.questions for q_id in question_inc) or any(o_id not in tally.options for o_id in option_inc):
+                # The other worker knows about questions/options we have not loaded yet
+                tally.loaded = False
+                return None
+            tally.version += 1
+            for q_id, n in question_inc.items():
+                tally.questions[q_id] += n
+            for o_id, n in option_inc.items():
+                tally.options[o_id] += n
+            answers = {int(k): v for k, v in (frame.get("answers") or {}).items()}
+            for q_id, texts in answers.items():
+                for text in texts:
+                    tally.add_answer(q_id, text)
+            result = {
+                "event": "tally",
+                "poll_id": tally.poll_id,
+                "base": tally.version - 1,
+                "version": tally.version,
+                "questions": {q_id: tally.questions[q_id] for q_id in question_inc},
+                "options": {o_id: tally.options[o_id] for o_id in option_inc},
+                "added": {"questions": question_inc, "options": option_inc},
+            }
+            if answers:
+                result["answers"] = answers
+                terms = {q_id: tally.terms[q_id].top() for q_id in answers if q_id in tally.terms}
+                if terms:
+                    result["terms"] = terms
+            return result
+
+    def add_pending(self, slug: str, question_id: int, option_id: Optional[int], text_answer: Optional[str] = None):
+        """Count a vote that has been acknowledged but not yet written to the database."""
+        with self._lock:
+            counts = self._pending.setdefault(slug, {})
+            key = (question_id, option_id)
+            counts[key] = counts.get(key, 0) + 1
+            if text_answer:
+                answers = self._pending_answers.setdefault(slug, {})
+                answers[(question_id, text_answer)] = answers.get((question_id, text_answer), 0) + 1
+
+    def begin_flush(self, slugs: Iterable[str]):
+        """
+        Called before a batch of pending votes is committed. Until the matching
+        `end_flush` no rebuilt tally is installed for these slugs, so a vote is never
+        counted both from the database and from the pending counts.
+        """
+        with self._lock:
+            for slug in slugs:
+                self._writes[slug] = self._writes.get(slug, 0) + 1
+                self._flushing[slug] = self._flushing.get(slug, 0) + 1
+
+    def end_flush(self, slugs: Iterable[str], written: Iterable[Tuple[str, int, Optional[int], Optional[str]]] = ()):
+        """
+        Called once the batch's transaction is over, with (slug, question_id,
+        option_id, text_answer) per vote it committed (none if it failed).
+        """
+        with self._lock:
+            for slug in slugs:
+                self._writes[slug] = self._writes.get(slug, 0) + 1
+                if self._flushing.get(slug, 0) <= 1:
+                    self._flushing.pop(slug, None)
+                else:
+                    self._flushing[slug] -= 1
+            self._release(written)
+
+    def drop_pending(self, votes: Iterable[Tuple[str, int, Optional[int], Optional[str]]]):
+        """Forget (slug, question_id, option_id, text_answer) pending votes that will never be written."""
+        with self._lock:
+            self._release(votes)
+
+    def _release(self, votes):
+        for slug, question_id, option_id, text_answer in votes:
+            self._writes[slug] = self._writes.get(slug, 0) + 1
+            _release(self._pending, slug, (question_id, option_id))
+            if text_answer:
+                _release(self._pending_answers, slug, (question_id, text_answer))
+
+    def invalidate(self, slug: str):
+        with self._lock:
+            tally = self._tallies.get(slug)
+            if tally is not None:
+                # Keep the entry (and its version) so the rebuilt tally continues the sequence
+                tally.loaded = False
+
+    def drop(self, slug: str):
+        with self._lock:
+            self._tallies.pop(slug, None)
+            self._writes.pop(slug, None)
+
+
+def _release(pending: dict, slug: str, key):
+    counts = pending.get(slug)
+    if not counts or key not in counts:
+        return
+    counts[key] -= 1
+    if counts[key] <= 0:
+        del counts[key]
+    if not counts:
+        del pending[slug]
+
+
+tally_cache = TallyCache()
+
+
+def tally_snapshot(slug: str) -> Optional[dict]:
+    """Full tally for a poll, sent to live displays on connect and whenever they resync."""
+    db = database.SessionLocal()
+    try:
+        poll = db.query(models.Poll).filter(models.Poll.slug == slug).first()
+        if not poll:
+            return None
+        return {"event": "snapshot", **tally_cache.get(slug, poll, db).to_dict(slug)}
+    finally:
+        db.close()
@@ -0,0 +1,153 @@
+"""
+Maintenance of the `vote_counts` rollup table.
+
+Every vote insert (single or batched) calls `add_votes` / `add_votes_async` in the
+same transaction, so reading a poll's results costs one row per option instead of
+one row per vote. Recounts include the votes of compacted questions, which live in
+`question_archives` instead of `votes` (see compaction.py). Run as a script to backfill or verify the table:
+
+    python -m app.vote_counts            # rebuild from the votes table
+    python -m app.vote_counts --verify   # report mismatches only
+"""
+import logging
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models, database, compaction
+
+logger = logging.getLogger(__name__)
+
+# (question_id, option_id) -> number of votes to add
+Counts = Dict[Tuple[int, Optional[int]], int]
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _upsert(dialect: str, question_id: int, option_id: Optional[int], n: int):
+    """
+    One-statement increment-or-create, so two transactions adding the first votes of
+    an option cannot both insert. None where it does not apply: the unique constraint
+    never matches a NULL option_id, and other dialects lack ON CONFLICT.
+    """
+    if option_id is None or dialect not in _UPSERT:
+        return None
+    return (
+        _UPSERT[dialect](models.VoteCount)
+        .values(question_id=question_id, option_id=option_id, count=n)
+        .on_conflict_do_update(index_elements=["question_id", "option_id"], set_={"count": models.VoteCount.count + n})
+    )
+
+
+def _increment(question_id: int, option_id: Optional[int], n: int):
+    option_match = models.VoteCount.option_id.is_(None) if option_id is None else models.VoteCount.option_id == option_id
+    # One row only: concurrent first votes can leave duplicate NULL-option rows, which reads sum
+    first = select(func.min(models.VoteCount.id)).where(models.VoteCount.question_id == question_id, option_match)
+    return update(models.VoteCount).where(models.VoteCount.id == first.scalar_subquery()).values(count=models.VoteCount.count + n)
+
+
+def _create(question_id: int, option_id: Optional[int], n: int):
+    return insert(models.VoteCount).values(question_id=question_id, option_id=option_id, count=n)
+
+
+def add_votes(db: Session, counts: Counts):
+    """Add to the running totals. Does not commit; call inside the vote's transaction."""
+    dialect = db.get_bind().dialect.name
+    for (question_id, option_id), n in counts.items():
+        upsert = _upsert(dialect, question_id, option_id, n)
+        if upsert is not None:
+            db.execute(upsert)
+        elif db.execute(_increment(question_id, option_id, n)).rowcount == 0:
+            db.execute(_create(question_id, option_id, n))
+
+
+async def add_votes_async(db: AsyncSession, counts: Counts):
+    dialect = db.get_bind().dialect.name
+    for (question_id, option_id), n in counts.items():
+        upsert = _upsert(dialect, question_id, option_id, n)
+        if upsert is not None:
+            await db.execute(upsert)
+        elif (await db.execute(_increment(question_id, option_id, n))).rowcount == 0:
+            await db.execute(_create(question_id, option_id, n))
+
+
+def _counted_votes(question_ids=None):
+    stmt = select(models.Vote.question_id, models.Vote.option_id, func.count(models.Vote.id)).group_by(
+        models.Vote.question_id, models.Vote.option_id
+    )
+    if question_ids is not None:
+        stmt = stmt.where(models.Vote.question_id.in_(question_ids))
+    return stmt
+
+
+def _recount(db: Session, question_ids=None) -> Counts:
+    counts = {(q, o): n for q, o, n in db.execute(_counted_votes(question_ids)).all()}
+    for key, n in compaction.archived_counts(db, question_ids).items():
+        counts[key] = counts.get(key, 0) + n
+    return counts
+
+
+def rebuild_question(db: Session, question_id: int):
+    """Recount one question from its votes (e.g. after options were deleted). Does not commit."""
+    db.execute(delete(models.VoteCount).where(models.VoteCount.question_id == question_id))
+    counts = _recount(db, [question_id])
+    if counts:
+        db.execute(insert(models.VoteCount), [{"question_id": q, "option_id": o, "count": n} for (q, o), n in counts.items()])
+
+
+def rebuild_all(db: Session) -> int:
+    db.execute(delete(models.VoteCount))
+    counts = _recount(db)
+    if counts:
+        db.execute(insert(models.VoteCount), [{"question_id": q, "option_id": o, "count": n} for (q, o), n in counts.items()])
+    db.commit()
+    return len(counts)
+
+
+def verify(db: Session) -> List[Tuple[int, Optional[int], int, int]]:
+    """Returns (question_id, option_id, counted, stored) for every mismatch."""
+    counted = _recount(db)
+    stored_rows = db.execute(
+        select(models.VoteCount.question_id, models.VoteCount.option_id, func.sum(models.VoteCount.count)).group_by(
+            models.VoteCount.question_id, models.VoteCount.option_id
+        )
+    ).all()
+    stored = {(q, o): n for q, o, n in stored_rows}
+    mismatches = []
+    for key in set(counted) | set(stored):
+        if counted.get(key, 0) != stored.get(key, 0):
+            mismatches.append((key[0], key[1], counted.get(key, 0), stored.get(key, 0)))
+    return sorted(mismatches, key=lambda m: (m[0], m[1] or 0))
+
+
+def ensure_backfilled():
+    """Fill an empty vote_counts table from existing votes (first start after upgrading)."""
+    db = database.SessionLocal()
+    try:
+        has_counts = db.execute(select(models.VoteCount.id).limit(1)).first()
+        has_votes = db.execute(select(models.Vote.id).limit(1)).first()
+        if not has_counts and has_votes:
+            rows = rebuild_all(db)
+            logger.info("Backfilled vote_counts (%d rows)", rows)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    db = database.SessionLocal()
+    try:
+        if "--verify" in sys.argv:
+            mismatches = verify(db)
+            for question_id, option_id, counted, stored in mismatches:
+                print(f"question {question_id} option {option_id}: votes={counted} vote_counts={stored}")
+            print(f"{len(mismatches)} mismatches.")
+            sys.exit(1 if mismatches else 0)
+        rows = rebuild_all(db)
+        print(f"Rebuilt vote_counts ({rows} rows).")
+    finally:
+        db.close()
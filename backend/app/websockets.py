@@ -1,27 +1,521 @@
-from typing import List, Dict
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Deque, List, Dict, Optional, Tuple
 from fastapi import WebSocket
+from .metrics import broadcast_fanout_duration
+
+logger = logging.getLogger(__name__)
+
+# Window (ms) during which broadcasts for the same poll are merged into one frame
+BROADCAST_WINDOW_MS = int(os.getenv("BROADCAST_WINDOW_MS", "150"))
+# Frames buffered per socket before stale ones are dropped
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))
+# Seconds a single send may take before the socket is considered dead
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Consecutive queue overflows before a slow client is disconnected
+SLOW_CONSUMER_LIMIT = int(os.getenv("WS_SLOW_CONSUMER_LIMIT", "8"))
+# Seconds between heartbeat pings; 0 disables heartbeats and reaping
+PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+# Seconds without any message from a client (pongs included) before its socket is reaped
+IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# Open sockets per poll and per process; connections beyond either are refused
+MAX_CONNECTIONS_PER_POLL = int(os.getenv("WS_MAX_CONNECTIONS_PER_POLL", "2000"))
+MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "10000"))
+# Events kept per poll so a reconnecting /polls/{slug}/stream client can resume (Last-Event-ID)
+SSE_REPLAY_SIZE = int(os.getenv("SSE_REPLAY_SIZE", "256"))
+# Polls whose replay buffers are kept, least recently subscribed dropped first
+SSE_REPLAY_POLLS = int(os.getenv("SSE_REPLAY_POLLS", "256"))
+
+# Event ids restart with the process, so they carry a per-process tag as well
+_EPOCH = secrets.token_hex(4)
+
+
+def encode_event(data: str, event_id: Optional[str] = None) -> str:
+    """One Server-Sent Event; json.dumps output has no newlines, so it fits one data line."""
+    return (f"id: {event_id}\n" if event_id else "") + f"data: {data}\n\n"
+
+class Connection:
+    """
+    A subscribed socket with its own bounded outbound queue and writer task, so a
+    slow or dead client never holds up the broadcast to everyone else.
+    """
+
+    # Receives Server-Sent Events instead of WebSocket frames
+    stream = False
+
+    def __init__(self, websocket: Optional[WebSocket], slug: str, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.slug = slug
+        self.manager = manager
+        # (event kind, encoded frame)
+        self.queue: Deque[Tuple[Optional[str], str]] = deque()
+        # Consecutive overflows since the queue was last drained
+        self.strikes = 0
+        self.closed = False
+        self.connected_at = time.monotonic()
+        # Last time the client sent anything; heartbeats reap sockets that went quiet
+        self.last_seen = self.connected_at
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop()) if websocket is not None else None
+
+    def enqueue(self, kind: Optional[str], data: str) -> bool:
+        """Queue an encoded frame. Returns False if the client has fallen too far behind."""
+        if self.closed:
+            return True
+        if len(self.queue) >= SEND_QUEUE_SIZE:
+            self._drop_superseded()
+            self.strikes += 1
+            if self.strikes > SLOW_CONSUMER_LIMIT:
+                return False
+        self.queue.append((kind, data))
+        self._ready.set()
+        return True
+
+    def send_json(self, message: dict) -> bool:
+        return self.enqueue(message.get("event"), json.dumps(message))
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def memory_bytes(self) -> int:
+        """Rough footprint of this object, its queue and writer task; queued frames are counted by the manager."""
+        return sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self.queue) + sys.getsizeof(self._writer)
+
+    def _drop_superseded(self):
+        # The oldest frame that has a newer frame of the same kind behind it is stale state.
+        # If nothing is superseded, drop the oldest frame; a missing tally frame shows up
+        # as a version gap on the client, which then resyncs.
+        seen = set()
+        victim = 0
+        for i in range(len(self.queue) - 1, -1, -1):
+            kind = self.queue[i][0]
+            if kind in seen:
+                victim = i
+            seen.add(kind)
+        del self.queue[victim]
+        self.manager.stats["dropped_frames"] += 1
+
+    async def _write_loop(self):
+        try:
+            while True:
+                while not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                _, data = self.queue.popleft()
+                await asyncio.wait_for(self.websocket.send_text(data), SEND_TIMEOUT)
+                if not self.queue:
+                    self.strikes = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.manager.stats["send_failures"] += 1
+            self.manager.disconnect(self)
+            # Close the socket too, or the endpoint sits in receive until TCP gives up; 1011: server error
+            asyncio.create_task(self.close(code=1011))
+
+    def shutdown(self):
+        """Stop writing; the manager has already dropped the connection."""
+        self.closed = True
+        self._writer.cancel()
+
+    async def close(self, code: int = 1000):
+        self.shutdown()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), SEND_TIMEOUT)
+        except Exception:
+            pass
+
+
+class StreamConnection(Connection):
+    """
+    A `GET /polls/{slug}/stream` subscriber. Frames are queued exactly as for a
+    socket; the response body iterates `events`, which takes the place of the
+    writer task.
+    """
+
+    stream = True
+
+    def __init__(self, slug: str, manager: "ConnectionManager"):
+        super().__init__(None, slug, manager)
+
+    def prepend(self, kind: Optional[str], data: str):
+        # The snapshot is read after subscribing and goes ahead of anything queued meanwhile
+        self.queue.appendleft((kind, data))
+        self._ready.set()
+
+    async def events(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                _, data = self.queue.popleft()
+                yield data
+                # Resumed once the previous event has been written, so a stalled client goes quiet and is reaped
+                self.touch()
+                if not self.queue:
+                    self.strikes = 0
+        finally:
+            self.manager.disconnect(self)
+
+    def shutdown(self):
+        self.closed = True
+        self._ready.set()
+
+    async def close(self, code: int = 1000):
+        self.shutdown()
+
+
+class _ReplayLog:
+    __slots__ = ("sequence", "events")
+
+    def __init__(self, size: int):
+        self.sequence = 0
+        # (sequence, kind, encoded event)
+        self.events: Deque[Tuple[int, Optional[str], str]] = deque(maxlen=size)
+
+
+class ReplayBuffer:
+    """
+    The last SSE_REPLAY_SIZE stream events of each poll, numbered per poll, for
+    Last-Event-ID resume. Only polls that have had a stream subscriber are
+    logged, and only the SSE_REPLAY_POLLS most recently subscribed are kept.
+    """
+
+    def __init__(self, size: int = SSE_REPLAY_SIZE, max_polls: int = SSE_REPLAY_POLLS):
+        self.size = size
+        self.max_polls = max_polls
+        self._logs: "OrderedDict[str, _ReplayLog]" = OrderedDict()
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self._logs
+
+    def track(self, slug: str):
+        if slug in self._logs:
+            self._logs.move_to_end(slug)
+            return
+        self._logs[slug] = _ReplayLog(self.size)
+        while len(self._logs) > self.max_polls:
+            self._logs.popitem(last=False)
+
+    def discard(self, slug: str):
+        self._logs.pop(slug, None)
+
+    def record(self, slug: str, kind: Optional[str], data: str) -> Optional[str]:
+        """Number and encode a broadcast frame; None if the poll is not logged."""
+        log = self._logs.get(slug)
+        if log is None:
+            return None
+        log.sequence += 1
+        event = encode_event(data, f"{_EPOCH}-{log.sequence}")
+        log.events.append((log.sequence, kind, event))
+        return event
+
+    def last_id(self, slug: str) -> Optional[str]:
+        log = self._logs.get(slug)
+        return f"{_EPOCH}-{log.sequence}" if log is not None else None
+
+    def since(self, slug: str, last_event_id: str) -> Optional[List[Tuple[Optional[str], str]]]:
+        """(kind, event) for every event after `last_event_id`, or None if they are no longer all here."""
+        log = self._logs.get(slug)
+        epoch, _, sequence = last_event_id.partition("-")
+        if log is None or epoch != _EPOCH or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = log.events[0][0] if log.events else log.sequence + 1
+        if sequence > log.sequence or sequence < oldest - 1:
+            return None
+        return [(kind, event) for n, kind, event in log.events if n > sequence]
+
+    def snapshot_stats(self) -> dict:
+        return {"polls": len(self._logs), "events": sum(len(log.events) for log in self._logs.values()), "size": self.size}
+
 
 class ConnectionManager:
-    def __init__(self):
-        # Map slug -> List[WebSocket]
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    """
+    Open sockets and event streams by poll.
+
+    Each poll's subscribers are kept as the keys of a dict (an insertion-ordered set),
+    so connecting and disconnecting are O(1) however many viewers a poll has.
+    A heartbeat task pings every socket each PING_INTERVAL seconds and reaps those
+    that have not sent anything, pongs included, for IDLE_TIMEOUT seconds (streams
+    cannot answer, so for them it counts from the last event written): half-open
+    connections (a laptop that went to sleep) never raise on the server side, and
+    would otherwise be broadcast to forever.
+    """
 
-    async def connect(self, websocket: WebSocket, slug: str):
+    def __init__(
+        self,
+        ping_interval: float = PING_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_per_poll: int = MAX_CONNECTIONS_PER_POLL,
+        max_connections: int = MAX_CONNECTIONS,
+    ):
+        # Map slug -> {Connection: None}
+        self.active_connections: Dict[str, Dict[Connection, None]] = {}
+        self.count = 0
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.max_per_poll = max_per_poll
+        self.max_connections = max_connections
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.replay = ReplayBuffer()
+        self.stats = {"dropped_frames": 0, "evictions": 0, "send_failures": 0, "rejected": 0, "reaped": 0, "pings": 0}
+
+    async def start(self):
+        if self.ping_interval > 0:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat is None:
+            return
+        self._heartbeat.cancel()
+        try:
+            await self._heartbeat
+        except asyncio.CancelledError:
+            pass
+        self._heartbeat = None
+
+    def _full(self, slug: str) -> bool:
+        peers = self.active_connections.get(slug)
+        if self.count >= self.max_connections or (peers is not None and len(peers) >= self.max_per_poll):
+            self.stats["rejected"] += 1
+            return True
+        return False
+
+    def _register(self, connection: Connection):
+        self.active_connections.setdefault(connection.slug, {})[connection] = None
+        self.count += 1
+
+    async def connect(self, websocket: WebSocket, slug: str) -> Optional[Connection]:
+        """Accept a socket; returns None (after closing it) when a connection cap is reached."""
         await websocket.accept()
-        if slug not in self.active_connections:
-            self.active_connections[slug] = []
-        self.active_connections[slug].append(websocket)
+        if self._full(slug):
+            # 1013: try again later
+            await websocket.close(code=1013)
+            return None
+        connection = Connection(websocket, slug, self)
+        self._register(connection)
+        return connection
+
+    def subscribe_stream(self, slug: str, last_event_id: Optional[str] = None) -> Tuple[Optional[StreamConnection], bool]:
+        """
+        Add a stream subscriber. With a `last_event_id` still covered by the replay
+        buffer, the missed events are queued and the second value is True; otherwise
+        the caller sends a snapshot first. Returns (None, False) at a connection cap.
+        """
+        if self._full(slug):
+            return None, False
+        connection = StreamConnection(slug, self)
+        self._register(connection)
+        self.replay.track(slug)
+        missed = self.replay.since(slug, last_event_id) if last_event_id else None
+        for kind, event in missed or ():
+            connection.enqueue(kind, event)
+        return connection, missed is not None
+
+    def disconnect(self, connection: Connection):
+        peers = self.active_connections.get(connection.slug)
+        if peers is not None and connection in peers:
+            del peers[connection]
+            self.count -= 1
+            if not peers:
+                del self.active_connections[connection.slug]
+        if not connection.closed:
+            connection.shutdown()
+
+    def evict(self, connection: Connection):
+        """Disconnect a client that cannot keep up."""
+        self.stats["evictions"] += 1
+        self.disconnect(connection)
+        # 1013: try again later; the client reconnects and gets a fresh snapshot
+        asyncio.create_task(connection.close(code=1013))
 
-    def disconnect(self, websocket: WebSocket, slug: str):
-        if slug in self.active_connections:
-            if websocket in self.active_connections[slug]:
-                self.active_connections[slug].remove(websocket)
-            if not self.active_connections[slug]:
-                del self.active_connections[slug]
+    def reap(self, connection: Connection):
+        """Disconnect a client that stopped answering heartbeats."""
+        self.stats["reaped"] += 1
+        self.disconnect(connection)
+        # 1001: going away; a client that is in fact alive reconnects
+        asyncio.create_task(connection.close(code=1001))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Heartbeat sweep failed")
+
+    def sweep(self, now: Optional[float] = None):
+        """Reap sockets idle past the timeout and ping the others."""
+        now = time.monotonic() if now is None else now
+        frame = json.dumps({"event": "ping", "interval": self.ping_interval})
+        stream_frame = encode_event(frame)
+        for peers in list(self.active_connections.values()):
+            for connection in list(peers):
+                if now - connection.last_seen > self.idle_timeout:
+                    self.reap(connection)
+                elif connection.enqueue("ping", stream_frame if connection.stream else frame):
+                    self.stats["pings"] += 1
+                else:
+                    self.evict(connection)
 
     async def broadcast(self, message: dict, slug: str):
-        if slug in self.active_connections:
-            for connection in self.active_connections[slug]:
-                await connection.send_json(message)
+        connections = self.active_connections.get(slug)
+        if not connections and slug not in self.replay:
+            return
+        started = time.perf_counter()
+        # Encode once for every subscriber (and once more as an event for streams)
+        data = json.dumps(message)
+        kind = message.get("event")
+        # Logged even with nobody subscribed, so a display that is reconnecting can catch up
+        event = self.replay.record(slug, kind, data)
+        for connection in list(connections or ()):
+            if connection.stream and event is None:
+                event = encode_event(data)
+            if not connection.enqueue(kind, event if connection.stream else data):
+                self.evict(connection)
+        broadcast_fanout_duration.observe(time.perf_counter() - started)
+
+    def describe(self, slug: str) -> dict:
+        """Connections of one poll, with their queues and approximate memory use."""
+        peers = list(self.active_connections.get(slug, ()))
+        now = time.monotonic()
+        # Broadcast frames are encoded once and shared by every queue holding them
+        frames = {id(data): data for connection in peers for _, data in connection.queue}
+        frame_bytes = sum(sys.getsizeof(data) for data in frames.values())
+        return {
+            "slug": slug,
+            "connections": len(peers),
+            "streams": sum(1 for connection in peers if connection.stream),
+            "limit": self.max_per_poll,
+            "queued_frames": sum(len(connection.queue) for connection in peers),
+            "memory_bytes": sum(connection.memory_bytes() for connection in peers) + frame_bytes,
+            "oldest_connection_s": round(max((now - c.connected_at for c in peers), default=0), 1),
+            "longest_idle_s": round(max((now - c.last_seen for c in peers), default=0), 1),
+        }
+
+    def describe_all(self, limit: int = 20) -> List[dict]:
+        """`describe` for the `limit` polls with the most connections."""
+        busiest = sorted(self.active_connections, key=lambda slug: -len(self.active_connections[slug]))
+        return [self.describe(slug) for slug in busiest[:limit]]
+
+    def snapshot_stats(self) -> dict:
+        return {
+            **self.stats,
+            "slugs": len(self.active_connections),
+            "connections": self.count,
+            "limit": self.max_connections,
+            "ping_interval_s": self.ping_interval,
+            "idle_timeout_s": self.idle_timeout,
+            "replay": self.replay.snapshot_stats(),
+        }
 
 manager = ConnectionManager()
+
+
+class BroadcastScheduler:
+    """
+    Coalesces broadcasts per slug.
+
+    `publish` only queues the frame; the first frame for a slug starts a timer task
+    that sends everything queued for that slug once the window has passed. While
+    queued, consecutive tally frames are merged (later counts win) and repeated
+    "update" frames collapse into one.
+    """
+
+    def __init__(self, manager: ConnectionManager, window_ms: int = BROADCAST_WINDOW_MS):
+        # Where flushed frames go: the local sockets by default, or a backplane (see backplane.py)
+        self.deliver = manager.broadcast
+        self.window = window_ms / 1000
+        # slug -> frames waiting for the next flush
+        self._pending: Dict[str, List[dict]] = {}
+        self._timers: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "published": 0,  # frames handed to publish()
+            "merged": 0,     # frames folded into an already queued frame
+            "sent": 0,       # frames actually broadcast
+            "flushes": 0,    # timer firings
+            "errors": 0,
+        }
+
+    async def publish(self, message: dict, slug: str):
+        self.stats["published"] += 1
+        frames = self._pending.setdefault(slug, [])
+        if not self._merge(frames, message):
+            frames.append(message)
+        if slug not in self._timers:
+            self._timers[slug] = asyncio.create_task(self._flush_later(slug))
+
+    def _merge(self, frames: List[dict], message: dict) -> bool:
+        event = message.get("event")
+        if event == "update":
+            if any(f.get("event") == "update" for f in frames):
+                self.stats["merged"] += 1
+                return True
+            return False
+        if event == "tally" and frames:
+            last = frames[-1]
+            if last.get("event") == "tally" and last.get("version") == message.get("base"):
+                last["version"] = message["version"]
+                last["questions"] = {**last["questions"], **message["questions"]}
+                last["options"] = {**last["options"], **message["options"]}
+                if "added" in message:
+                    added = last.setdefault("added", {"questions": {}, "options": {}})
+                    for key in ("questions", "options"):
+                        for item_id, n in message["added"][key].items():
+                            added[key][item_id] = added[key].get(item_id, 0) + n
+                if message.get("terms"):
+                    last["terms"] = {**last.get("terms", {}), **message["terms"]}
+                if message.get("answers"):
+                    answers = last.setdefault("answers", {})
+                    for q_id, texts in message["answers"].items():
+                        answers[q_id] = answers.get(q_id, []) + texts
+                self.stats["merged"] += 1
+                return True
+        return False
+
+    async def _flush_later(self, slug: str):
+        await asyncio.sleep(self.window)
+        # A timer cancelled by flush_all leaves the slug alone: flush_all took its frames,
+        # and a newer timer may own the slug (and its newly queued frames) by now
+        if self._timers.get(slug) is not asyncio.current_task():
+            return
+        del self._timers[slug]
+        frames = self._pending.pop(slug, [])
+        self.stats["flushes"] += 1
+        for frame in frames:
+            try:
+                await self.deliver(frame, slug)
+                self.stats["sent"] += 1
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception("Broadcast to %s failed", slug)
+
+    async def flush_all(self):
+        """Send everything still queued (used on shutdown)."""
+        timers = list(self._timers.values())
+        self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        pending, self._pending = self._pending, {}
+        for slug, frames in pending.items():
+            for frame in frames:
+                try:
+                    await self.deliver(frame, slug)
+                    self.stats["sent"] += 1
+                except Exception:
+                    self.stats["errors"] += 1
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "window_ms": int(self.window * 1000), "pending_slugs": len(self._pending)}
+
+scheduler = BroadcastScheduler(manager)
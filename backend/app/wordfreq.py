@@ -0,0 +1,94 @@
+import heapq
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Terms returned per open-ended question
+WORDCLOUD_TOP_K = int(os.getenv("WORDCLOUD_TOP_K", "50"))
+# Counters kept per question; more than K so terms near the cut-off are ranked reliably
+WORDCLOUD_CAPACITY = int(os.getenv("WORDCLOUD_CAPACITY", str(WORDCLOUD_TOP_K * 4)))
+
+_TOKEN_RE = re.compile(r"[\w']+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are aren't as at be because been before being below
+between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down during each
+few for from further had hadn't has hasn't have haven't having he he'd he'll he's her here here's hers herself
+him himself his how how's i i'd i'll i'm i've if in into is isn't it it's its itself let's me more most mustn't
+my myself no nor not of off on once only or other ought our ours ourselves out over own same shan't she she'd
+she'll she's should shouldn't so some such than that that's the their theirs them themselves then there
+there's these they they'd they'll they're they've this those through to too under until up very was wasn't
+we we'd we'll we're we've were weren't what what's when when's where where's which while who who's whom why
+why's will with won't would wouldn't you you'd you'll you're you've your yours yourself yourselves
+just also really very much lot lots get got like yes
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words with stopwords, numbers-only and one-letter tokens removed."""
+    terms = []
+    for raw in _TOKEN_RE.findall(text.lower()):
+        term = raw.strip("'_")
+        if len(term) < 2 or term in STOPWORDS or term.isdigit():
+            continue
+        terms.append(term)
+    return terms
+
+
+class HeavyHitters:
+    """
+    Space-Saving top-K counter.
+
+    Holds at most `capacity` terms. When a new term arrives and the table is full it
+    replaces the current minimum and inherits its count (recorded as the error bound),
+    so memory stays fixed however many distinct words an audience types, while the
+    frequent terms are still counted exactly once they are in the table.
+
+    The minimum is found through a heap of (count, term) entries. Increments push a
+    fresh entry instead of updating the old one; stale entries are skipped when
+    popped, and the heap is rebuilt from the table once they pile up.
+    """
+
+    def __init__(self, capacity: int = WORDCLOUD_CAPACITY):
+        self.capacity = capacity
+        # term -> [count, error]
+        self.counters: Dict[str, List[int]] = {}
+        self._heap: List[Tuple[int, str]] = []
+        # Last top() result, until the counts change
+        self._top: Optional[Tuple[int, List[Tuple[str, int]]]] = None
+
+    def add(self, term: str, n: int = 1):
+        self._top = None
+        counter = self.counters.get(term)
+        if counter is not None:
+            counter[0] += n
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[term] = [n, 0]
+        else:
+            floor = self._pop_min()
+            counter = self.counters[term] = [floor + n, floor]
+        if len(self._heap) >= 4 * self.capacity:
+            self._heap = [(c[0], t) for t, c in self.counters.items()]
+            heapq.heapify(self._heap)
+        else:
+            heapq.heappush(self._heap, (counter[0], term))
+
+    def _pop_min(self) -> int:
+        """Evict the term with the lowest count and return that count."""
+        while True:
+            count, term = heapq.heappop(self._heap)
+            counter = self.counters.get(term)
+            if counter is not None and counter[0] == count:
+                del self.counters[term]
+                return count
+
+    def add_text(self, text: str, n: int = 1):
+        for term in tokenize(text):
+            self.add(term, n)
+
+    def top(self, k: int = WORDCLOUD_TOP_K) -> List[Tuple[str, int]]:
+        if self._top is not None and self._top[0] == k:
+            return list(self._top[1])
+        ranked = heapq.nsmallest(k, self.counters.items(), key=lambda item: (-item[1][0], item[0]))
+        self._top = (k, [(term, counter[0]) for term, counter in ranked])
+        return list(self._top[1])
@@ -0,0 +1,156 @@
+"""
+Query plans and timings with and without the indexes added by migration 3.
+
+Builds a throwaway SQLite database, fills it with a large synthetic dataset, drops
+the indexes from migrations.INDEXES, and runs the hot queries (tally recount,
+open-ended answer stream, export, question cascade, poll listing). Then it applies
+the migration and runs them again.
+
+    python bench_indexes.py                     # 200 polls, 500k votes
+    python bench_indexes.py --polls 50 --votes 100000 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, delete, select, text
+
+from app import models, migrations, export, vote_counts
+from app.tally import _answers_query
+
+
+def seed(engine, polls, votes):
+    models.Base.metadata.create_all(bind=engine)
+    now = "2025-01-01 00:00:00"
+    question_rows, option_rows, mc_questions, open_questions = [], [], [], []
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, hashed_password) VALUES (1, 'bench', '')"))
+        conn.execute(
+            text("INSERT INTO polls (id, title, slug, is_active, created_at, owner_id, color_palette, slide_duration, enable_title_page) "
+                 "VALUES (:id, :title, :slug, :active, :created, 1, 'lehigh_soft', 3, 0)"),
+            [{"id": p, "title": f"Poll {p}", "slug": f"b{p:05d}", "active": p % 3 != 0, "created": now} for p in range(1, polls + 1)],
+        )
+        q_id = o_id = 0
+        for p in range(1, polls + 1):
+            for order in range(5):
+                q_id += 1
+                open_ended = order == 4
+                question_rows.append({"id": q_id, "poll": p, "order": order, "type": "OPEN_ENDED" if open_ended else "MULTIPLE_CHOICE"})
+                if open_ended:
+                    open_questions.append(q_id)
+                    continue
+                options = []
+                for _ in range(4):
+                    o_id += 1
+                    option_rows.append({"id": o_id, "q": q_id})
+                    options.append(o_id)
+                mc_questions.append((q_id, options))
+        conn.execute(
+            text('INSERT INTO questions (id, poll_id, "order", question_type, visualization_type, text) VALUES (:id, :poll, :order, :type, \'bar\', \'Q\')'),
+            question_rows,
+        )
+        conn.execute(text("INSERT INTO options (id, question_id, text) VALUES (:id, :q, 'O')"), option_rows)
+        words = ["alpha", "beta", "gamma", "delta", "epsilon"]
+        batch = []
+        for _ in range(votes):
+            if random.random() < 0.8:
+                q, options = random.choice(mc_questions)
+                batch.append({"q": q, "o": random.choice(options), "t": None, "c": now})
+            else:
+                batch.append({"q": random.choice(open_questions), "o": None, "t": random.choice(words), "c": now})
+            if len(batch) == 50000:
+                conn.execute(text("INSERT INTO votes (question_id, option_id, text_answer, created_at) VALUES (:q, :o, :t, :c)"), batch)
+                batch = []
+        if batch:
+            conn.execute(text("INSERT INTO votes (question_id, option_id, text_answer, created_at) VALUES (:q, :o, :t, :c)"), batch)
+    return mc_questions, open_questions
+
+
+def drop_indexes(engine):
+    with engine.begin() as conn:
+        for name, _, _ in migrations.INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("ANALYZE"))
+
+
+def add_indexes(engine):
+    with engine.begin() as conn:
+        migrations.add_foreign_key_indexes(conn)
+        conn.execute(text("ANALYZE"))
+
+
+def queries(polls, mc_questions, open_questions):
+    poll_id = polls // 2
+    question_id = mc_questions[len(mc_questions) // 2][0]
+    open_poll = (open_questions[len(open_questions) // 2] - 1) // 5 + 1
+    return [
+        ("recount question (vote_counts.rebuild_question)", vote_counts._counted_votes([question_id]), False),
+        ("open-ended answers (tally build)", _answers_query(open_poll), False),
+        ("export rows", export._rows_query(poll_id), False),
+        ("question cascade: votes", delete(models.Vote).where(models.Vote.question_id == question_id), True),
+        ("option cascade: votes", delete(models.Vote).where(models.Vote.option_id == mc_questions[0][1][0]), True),
+        ("poll questions", select(models.Question).where(models.Question.poll_id == poll_id).order_by(models.Question.order), False),
+        ("active polls page", select(models.Poll.id).where(models.Poll.is_active == True).order_by(models.Poll.created_at.desc(), models.Poll.id.desc()).limit(50), False),
+    ]
+
+
+def run(engine, cases, repeat):
+    results = []
+    for label, stmt, is_write in cases:
+        compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+        with engine.connect() as conn:
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+            conn.rollback()
+            timings = []
+            for _ in range(repeat):
+                trans = conn.begin()
+                started = time.perf_counter()
+                result = conn.execute(stmt)
+                if not is_write:
+                    result.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+                # Deletes are rolled back so every run sees the same data
+                trans.rollback()
+        results.append((label, plan, statistics.median(timings)))
+    return results
+
+
+def report(title, results):
+    print(f"\n== {title}")
+    for label, plan, ms in results:
+        print(f"{label:50s} {ms:9.2f} ms")
+        for step in plan:
+            print(f"    {step}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default="/tmp/quickpoll-bench.db")
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--votes", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    engine = create_engine(f"sqlite:///{args.db}")
+
+    started = time.perf_counter()
+    mc_questions, open_questions = seed(engine, args.polls, args.votes)
+    print(f"Seeded {args.polls} polls, {args.votes} votes in {time.perf_counter() - started:.1f}s ({args.db})")
+    cases = queries(args.polls, mc_questions, open_questions)
+
+    drop_indexes(engine)
+    before = run(engine, cases, args.repeat)
+    report("without indexes", before)
+
+    add_indexes(engine)
+    after = run(engine, cases, args.repeat)
+    report("with migration 3 indexes", after)
+
+    print("\n== speedup")
+    for (label, _, old), (_, _, new) in zip(before, after):
+        print(f"{label:50s} {old / new if new else float('inf'):8.1f}x")
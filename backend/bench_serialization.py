@@ -0,0 +1,150 @@
+"""
+Serialization and compression of poll responses, old path against the fast path.
+
+Builds a synthetic poll in memory (no database) and times, per response:
+  - GET /polls/{slug}: schemas.Poll validation + model_dump_json vs serialization.poll_json
+  - GET /polls/{slug}/results: PollResults validation + stdlib json vs orjson
+  - GET /polls/: PollSummary validation + stdlib json vs serialization.summaries_json
+and checks that both paths produce the same bytes. Then it reports the gzip and
+brotli sizes and times of the poll body.
+
+    python bench_serialization.py                         # 10 questions, 5000 votes
+    python bench_serialization.py --questions 20 --votes 50000 --repeat 20
+"""
+import argparse
+import datetime
+import gzip
+import json
+import random
+import statistics
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app import models, schemas, serialization
+from app.compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+from app.tally import PollTally
+from app.wordfreq import HeavyHitters
+
+WORDS = ["Challenging", "Growth", "Fast", "AI", "Remote", "Busy", "Exciting", "Chaotic", "naïve", "\"quoted\""]
+
+
+def build_poll(questions: int, votes: int) -> models.Poll:
+    start = datetime.datetime(2025, 1, 1, 9, 0, 0)
+    poll = models.Poll(
+        id=1, title="Benchmark", slug="bench1", owner_id=1, created_at=start, closes_at=start + datetime.timedelta(hours=2),
+        color_palette="lehigh_soft", slide_duration=3, enable_title_page=False, is_active=True,
+    )
+    vote_id = option_id = 0
+    for q in range(questions):
+        open_ended = q % 4 == 3
+        question = models.Question(
+            id=q + 1, poll_id=1, order=q, text=f"Question {q + 1}",
+            question_type=models.QuestionType.OPEN_ENDED if open_ended else models.QuestionType.MULTIPLE_CHOICE,
+            visualization_type="wordcloud" if open_ended else "bar",
+        )
+        if not open_ended:
+            for o in range(4):
+                option_id += 1
+                question.options.append(models.Option(id=option_id, question_id=question.id, text=f"Option {o + 1}"))
+        for _ in range(votes // questions):
+            vote_id += 1
+            # Every other timestamp on a whole second, which drops the fraction
+            created_at = start + datetime.timedelta(seconds=vote_id, microseconds=(vote_id % 2) * random.randint(1, 999999))
+            if open_ended:
+                vote = models.Vote(id=vote_id, question_id=question.id, text_answer=" ".join(random.sample(WORDS, 3)), created_at=created_at)
+            else:
+                option = random.choice(question.options)
+                vote = models.Vote(id=vote_id, question_id=question.id, option_id=option.id, created_at=created_at)
+                option.votes.append(vote)
+            question.votes.append(vote)
+        poll.questions.append(question)
+    return poll
+
+
+def build_tally(poll: models.Poll) -> dict:
+    tally = PollTally(poll.id)
+    for question in poll.questions:
+        tally.questions[question.id] = len(question.votes)
+        for option in question.options:
+            tally.options[option.id] = len(option.votes)
+        if question.question_type == models.QuestionType.OPEN_ENDED:
+            tally.terms[question.id] = HeavyHitters()
+            for vote in question.votes:
+                tally.add_answer(question.id, vote.text_answer)
+    return tally.to_dict(poll.slug)
+
+
+def timed(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(timings)
+
+
+def stdlib_json(content) -> bytes:
+    # What FastAPI's JSONResponse does with a validated response model
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--polls", type=int, default=50, help="rows in the listing")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    poll = build_poll(args.questions, args.votes)
+    results = build_tally(poll)
+    rows = [(poll, len(poll.questions), args.votes)] * args.polls
+    results_adapter = TypeAdapter(schemas.PollResults)
+    summaries_adapter = TypeAdapter(List[schemas.PollSummary])
+
+    cases = [
+        (
+            "poll tree",
+            lambda: schemas.Poll.model_validate(poll, from_attributes=True).model_dump_json().encode(),
+            lambda: serialization.poll_json(poll),
+        ),
+        (
+            "results",
+            lambda: stdlib_json(results_adapter.dump_python(results_adapter.validate_python(results), mode="json")),
+            lambda: serialization.dumps(results),
+        ),
+        (
+            "poll listing",
+            lambda: stdlib_json(summaries_adapter.dump_python([
+                schemas.PollSummary(
+                    id=p.id, title=p.title, slug=p.slug, owner_id=p.owner_id, created_at=p.created_at, closes_at=p.closes_at,
+                    closed_at=p.closed_at, is_active=p.is_active, question_count=q, total_votes=v,
+                )
+                for p, q, v in rows
+            ], mode="json")),
+            lambda: serialization.summaries_json(rows),
+        ),
+    ]
+
+    print(f"{args.questions} questions, {args.votes} votes, {args.polls} listing rows; median of {args.repeat}")
+    print(f"{'response':15s} {'bytes':>9s} {'old ms':>9s} {'fast ms':>9s} {'speedup':>8s}  identical")
+    body = None
+    for label, old, fast in cases:
+        old_body, old_ms = timed(old, args.repeat)
+        fast_body, fast_ms = timed(fast, args.repeat)
+        print(f"{label:15s} {len(fast_body):9d} {old_ms:9.2f} {fast_ms:9.2f} {old_ms / fast_ms:7.1f}x  {old_body == fast_body}")
+        if body is None:
+            body = fast_body
+
+    print(f"\n== compression of the poll tree ({len(body)} bytes)")
+    compressed, ms = timed(lambda: gzip.compress(body, GZIP_LEVEL), args.repeat)
+    print(f"gzip -{GZIP_LEVEL:<6d} {len(compressed):9d} bytes {ms:8.2f} ms  ({len(body) / len(compressed):.1f}x smaller)")
+    if brotli is not None:
+        compressed, ms = timed(lambda: brotli.compress(body, quality=BROTLI_QUALITY), args.repeat)
+        print(f"brotli q{BROTLI_QUALITY:<5d} {len(compressed):9d} bytes {ms:8.2f} ms  ({len(body) / len(compressed):.1f}x smaller)")
+    else:
+        print("brotli          not installed")
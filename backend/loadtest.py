@@ -0,0 +1,218 @@
+"""
+Load generator for a local instance.
+
+Creates a poll with the seed helpers (so run it against the same DATABASE_URL as
+the server), opens WebSocket listeners on the poll as displays would, then has
+concurrent voters answer every question through the HTTP API. Reports vote
+latency percentiles, throughput and broadcast lag, and writes them to JSON so
+runs can be compared. Its client libraries are not server dependencies:
+
+    pip install -r requirements-dev.txt
+    python loadtest.py --voters 1000 --listeners 200
+    python loadtest.py --url http://localhost:8000 --questions 5 --options 6 --out runs/baseline.json
+
+Broadcast lag is measured per listener: when a frame reports that a question has
+reached N new votes, the lag is the time since the Nth vote on that question was
+sent. It therefore includes the vote request itself and any broadcast coalescing.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+import websockets
+
+from app.database import SessionLocal
+from seed_data import WORDS, get_or_create_user, create_poll
+
+
+def build_poll(username, questions, options, open_ended):
+    questions_data = [
+        {
+            "text": f"Load test question {i + 1}",
+            "type": "multiple_choice",
+            "vis": "bar",
+            "options": [f"Option {j + 1}" for j in range(options)],
+        }
+        for i in range(questions)
+    ]
+    if open_ended:
+        questions_data.append({"text": "One word?", "type": "open_ended", "vis": "wordcloud", "options": []})
+    db = SessionLocal()
+    try:
+        user = get_or_create_user(db, username)
+        poll, created = create_poll(db, user, f"Load test {datetime.datetime.utcnow():%Y-%m-%d %H:%M:%S}", questions_data)
+        plan = [
+            {"id": item["q"].id, "type": item["q"].question_type.value, "options": [o.id for o in item["opts"]]}
+            for item in created
+        ]
+        return poll.slug, plan
+    finally:
+        db.close()
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))], 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 2),
+        "p50": pick(50),
+        "p90": pick(90),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class Run:
+    def __init__(self, plan):
+        self.plan = plan
+        # question_id -> send times of its votes, in send order
+        self.sent = {q["id"]: [] for q in plan}
+        self.latencies_ms = []
+        self.statuses = {}
+        self.errors = 0
+        self.lag_ms = []
+        self.frames = {}
+        self.listener_failures = 0
+
+
+async def listener(url, run, stop):
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            baseline = {}
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.perf_counter()
+                data = json.loads(raw)
+                event = data.get("event")
+                if event == "ping":
+                    # Answer the heartbeat like a browser would, or the server reaps us mid-run
+                    await ws.send(json.dumps({"action": "pong"}))
+                    continue
+                run.frames[event] = run.frames.get(event, 0) + 1
+                if event == "snapshot":
+                    baseline = {int(k): v for k, v in data.get("questions", {}).items()}
+                elif event == "tally":
+                    for q_id, total in data.get("questions", {}).items():
+                        q_id = int(q_id)
+                        sent = run.sent.get(q_id)
+                        n = total - baseline.get(q_id, 0)
+                        if sent and 0 < n <= len(sent):
+                            run.lag_ms.append((received - sent[n - 1]) * 1000)
+    except Exception as exc:
+        run.listener_failures += 1
+        print(f"listener failed: {exc!r}", file=sys.stderr)
+
+
+async def voter(client, slug, run, think_ms):
+    for question in run.plan:
+        payload = {"question_id": question["id"]}
+        if question["options"]:
+            payload["option_id"] = random.choice(question["options"])
+        else:
+            payload["text_answer"] = random.choice(WORDS)
+        started = time.perf_counter()
+        run.sent[question["id"]].append(started)
+        try:
+            response = await client.post(f"/polls/{slug}/vote", json=payload)
+            run.statuses[response.status_code] = run.statuses.get(response.status_code, 0) + 1
+        except httpx.HTTPError:
+            run.errors += 1
+            continue
+        run.latencies_ms.append((time.perf_counter() - started) * 1000)
+        if think_ms:
+            await asyncio.sleep(random.uniform(0, think_ms) / 1000)
+
+
+async def main(args):
+    slug, plan = build_poll(args.username, args.questions, args.options, not args.no_open_ended)
+    print(f"Poll {slug}: {len(plan)} questions, {args.voters} voters, {args.listeners} listeners")
+    run = Run(plan)
+    ws_url = args.url.replace("http", "ws", 1) + f"/ws/{slug}"
+    stop = asyncio.Event()
+    listeners = [asyncio.create_task(listener(ws_url, run, stop)) for _ in range(args.listeners)]
+    # Let the displays connect and receive their snapshot first
+    await asyncio.sleep(args.warmup)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        # Spread the arrivals over --ramp seconds, as students opening the link would
+        async def arrive(i):
+            await asyncio.sleep(random.uniform(0, args.ramp))
+            await voter(client, slug, run, args.think_ms)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(arrive(i) for i in range(args.voters)))
+        elapsed = time.perf_counter() - started
+
+    # Give the last broadcasts time to arrive
+    await asyncio.sleep(args.drain)
+    stop.set()
+    await asyncio.gather(*listeners)
+
+    accepted = run.statuses.get(200, 0)
+    result = {
+        "started_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "config": vars(args),
+        "poll": slug,
+        "questions": len(plan),
+        "votes": {
+            "sent": sum(len(v) for v in run.sent.values()),
+            "accepted": accepted,
+            "statuses": {str(k): v for k, v in sorted(run.statuses.items())},
+            "transport_errors": run.errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(accepted / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": percentiles(run.latencies_ms),
+        },
+        "broadcast": {
+            "listeners": args.listeners,
+            "listener_failures": run.listener_failures,
+            "frames": run.frames,
+            "lag_ms": percentiles(run.lag_ms),
+        },
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps({"votes": result["votes"], "broadcast": result["broadcast"]}, indent=2))
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a lecture hall voting on a live poll.")
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend base URL")
+    parser.add_argument("--username", default="admin", help="Owner of the generated poll")
+    parser.add_argument("--voters", type=int, default=1000)
+    parser.add_argument("--listeners", type=int, default=200, help="WebSocket displays to hold open")
+    parser.add_argument("--questions", type=int, default=3, help="Multiple-choice questions in the poll")
+    parser.add_argument("--options", type=int, default=4, help="Options per question")
+    parser.add_argument("--no-open-ended", action="store_true", help="Skip the open-ended question")
+    parser.add_argument("--concurrency", type=int, default=200, help="Max simultaneous HTTP connections")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which voters arrive")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="Max pause between a voter's answers")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds to wait after opening listeners")
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to wait for the last broadcasts")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--out", default=f"loadtest-results/{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    asyncio.run(main(args))
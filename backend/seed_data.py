@@ -1,40 +1,106 @@
 import random
 from app.database import SessionLocal
-from app import models
+from app import models, vote_counts
 from app.auth import get_password_hash
 import secrets
 
 import sys
+import datetime
+
+WORDS = ["Challenging", "Growth", "Fast", "AI", "Remote", "Busy", "Exciting", "Chaotic"]
+
+def get_or_create_user(db, username):
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if not user:
+        print(f"User {username} not found. Creating...")
+        hashed_password = get_password_hash("password")
+        user = models.User(username=username, hashed_password=hashed_password)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        print(f"Created user: {user.username} (ID: {user.id})")
+    else:
+        print(f"Seeding data for existing user: {user.username} (ID: {user.id})")
+    return user
+
+def create_poll(db, user, title, questions_data, closes_at=None):
+    """
+    Create a poll with its questions and options.
+    questions_data: [{"text", "type", "vis", "options": [option text, ...]}]
+    Returns (poll, [{"q": question, "opts": [options]}]).
+    """
+    slug = secrets.token_hex(3)
+    while db.query(models.Poll).filter(models.Poll.slug == slug).first():
+        slug = secrets.token_hex(3)
+    poll = models.Poll(title=title, slug=slug, owner_id=user.id, is_active=True, closes_at=closes_at)
+    db.add(poll)
+    db.commit()
+    db.refresh(poll)
+
+    created_questions = []
+
+    for idx, q_data in enumerate(questions_data):
+        question = models.Question(
+            text=q_data["text"],
+            question_type=q_data["type"],
+            visualization_type=q_data["vis"],
+            poll_id=poll.id,
+            order=idx
+        )
+        db.add(question)
+        db.commit()
+        db.refresh(question)
+        
+        # Add options
+        created_opts = []
+        if q_data["options"]:
+            for opt_text in q_data["options"]:
+                option = models.Option(text=opt_text, question_id=question.id)
+                db.add(option)
+                created_opts.append(option)
+            db.commit()
+        
+        created_questions.append({"q": question, "opts": created_opts})
+
+    return poll, created_questions
+
+def add_responses(db, created_questions, n, words=WORDS):
+    """Cast n responses, one vote per question each, and keep vote_counts in step."""
+    counts = {}
+
+    for i in range(n):
+        # For each question, cast a vote
+        for item in created_questions:
+            q = item["q"]
+            opts = item["opts"]
+            
+            vote = models.Vote(question_id=q.id)
+            
+            if q.question_type == "multiple_choice" and opts:
+                # Pick a random option, weighted slightly to make charts interesting
+                # e.g. triangular distribution to favor middle options or just random
+                selected_opt = random.choice(opts)
+                vote.option_id = selected_opt.id
+            
+            elif q.question_type == "open_ended":
+                 vote.text_answer = random.choice(words)
+
+            db.add(vote)
+            key = (vote.question_id, vote.option_id)
+            counts[key] = counts.get(key, 0) + 1
+    
+    vote_counts.add_votes(db, counts)
+    db.commit()
 
 def seed_data(target_username="admin"):
     db = SessionLocal()
     try:
         # 1. Get User
-        user = db.query(models.User).filter(models.User.username == target_username).first()
-        if not user:
-            print(f"User {target_username} not found. Creating...")
-            hashed_password = get_password_hash("password")
-            user = models.User(username=target_username, hashed_password=hashed_password)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-            print(f"Created user: {user.username} (ID: {user.id})")
-        else:
-            print(f"Seeding data for existing user: {user.username} (ID: {user.id})")
+        user = get_or_create_user(db, target_username)
 
-        # 2. Create Poll
-        poll_title = "Tech Team Survey 2025"
-        slug = secrets.token_hex(3)
+        # 2. Create Poll & 3. Questions & Options
         # Set close date to 7 days from now
-        import datetime
         closes_at = datetime.datetime.utcnow() + datetime.timedelta(days=7)
-        poll = models.Poll(title=poll_title, slug=slug, owner_id=user.id, is_active=True, closes_at=closes_at)
-        db.add(poll)
-        db.commit()
-        db.refresh(poll)
-        print(f"Created Poll: {poll.title} (slug: {poll.slug})")
-
-        # 3. Create Questions & Options
         questions_data = [
             {
                 "text": "What is your primary programming language?",
@@ -92,58 +158,14 @@ def seed_data(target_username="admin"):
             }
         ]
 
-        created_questions = []
-
-        for idx, q_data in enumerate(questions_data):
-            question = models.Question(
-                text=q_data["text"],
-                question_type=q_data["type"],
-                visualization_type=q_data["vis"],
-                poll_id=poll.id,
-                order=idx
-            )
-            db.add(question)
-            db.commit()
-            db.refresh(question)
-            
-            # Add options
-            created_opts = []
-            if q_data["options"]:
-                for opt_text in q_data["options"]:
-                    option = models.Option(text=opt_text, question_id=question.id)
-                    db.add(option)
-                    created_opts.append(option)
-                db.commit()
-            
-            created_questions.append({"q": question, "opts": created_opts})
-
+        poll, created_questions = create_poll(db, user, "Tech Team Survey 2025", questions_data, closes_at)
+        slug = poll.slug
+        print(f"Created Poll: {poll.title} (slug: {poll.slug})")
         print("Created Questions and Options.")
 
         # 4. Generate 100 Votes
         print("Generating 100 responses...")
-        
-        words = ["Challenging", "Growth", "Fast", "AI", "Remote", "Busy", "Exciting", "Chaotic"]
-
-        for i in range(100):
-            # For each question, cast a vote
-            for item in created_questions:
-                q = item["q"]
-                opts = item["opts"]
-                
-                vote = models.Vote(question_id=q.id)
-                
-                if q.question_type == "multiple_choice" and opts:
-                    # Pick a random option, weighted slightly to make charts interesting
-                    # e.g. triangular distribution to favor middle options or just random
-                    selected_opt = random.choice(opts)
-                    vote.option_id = selected_opt.id
-                
-                elif q.question_type == "open_ended":
-                     vote.text_answer = random.choice(words)
-
-                db.add(vote)
-        
-        db.commit()
+        add_responses(db, created_questions, 100)
         print("Successfully generated 100 responses!")
         print(f"Access the poll at: http://localhost:8081/poll/{slug}/display")
         print(f"Edit the poll at: http://localhost:8081/admin/poll/{slug}/edit")
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+# The app reads DATABASE_URL at import time; give the tests their own database
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from app import database, models  # noqa: E402
+
+
+@pytest.fixture
+def poll():
+    """(poll, question_id, [option_a, option_b]): a fresh poll with one multiple-choice question."""
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        poll = models.Poll(title="Test poll")
+        question = models.Question(text="Q", question_type=models.QuestionType.MULTIPLE_CHOICE)
+        question.options = [models.Option(text="a"), models.Option(text="b")]
+        poll.questions = [question]
+        db.add(poll)
+        db.commit()
+        ids = question.id, [option.id for option in question.options]
+        db.refresh(poll)
+        db.expunge(poll)
+        yield (poll, *ids)
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client():
+    """A TestClient for the app, signed in as user 1 (startup hooks are not run)."""
+    from fastapi.testclient import TestClient
+
+    from app import auth
+    from app.main import app
+
+    models.Base.metadata.create_all(bind=database.engine)
+    app.dependency_overrides[auth.get_current_user] = lambda: auth.Principal(1, "admin")
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(auth.get_current_user, None)
@@ -0,0 +1,118 @@
+"""
+Two workers sharing one (in-memory) Redis: tally frames published by one must
+leave the other's tally with the same counts, including when a frame arrives
+while the other worker is still loading its tally from the database.
+
+    cd backend && pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+from app import database, models, vote_counts
+from app.backplane import MemoryRedis, RedisBackplane
+from app.tally import TallyCache
+from app.websockets import ConnectionManager
+
+
+class Worker:
+    def __init__(self, name: str, broker: dict):
+        self.tally = TallyCache()
+        self.backplane = RedisBackplane(ConnectionManager(ping_interval=0), MemoryRedis(broker), worker_id=name, tally=self.tally)
+
+    def load(self, poll):
+        db = database.SessionLocal()
+        try:
+            return self.tally.get(poll.slug, poll, db)
+        finally:
+            db.close()
+
+    async def vote(self, poll, question_id: int, option_id: int):
+        """Commit a vote, apply it to this worker's tally and publish the delta, like submit_vote."""
+        await self.publish(poll, self.commit(poll, question_id, option_id))
+
+    def commit(self, poll, question_id: int, option_id: int) -> dict:
+        tally = self.load(poll)
+        db = database.SessionLocal()
+        try:
+            db.add(models.Vote(question_id=question_id, option_id=option_id))
+            vote_counts.add_votes(db, {(question_id, option_id): 1})
+            db.commit()
+        finally:
+            db.close()
+        return self.tally.record_votes(poll.slug, tally, [(question_id, option_id, None)])
+
+    async def publish(self, poll, delta: dict):
+        await self.backplane.publish({"event": "tally", "poll_id": poll.id, **delta}, poll.slug)
+
+
+async def _delivered(worker: Worker, received: int):
+    for _ in range(100):
+        if worker.backplane.stats["received"] >= received:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("frame never reached the other worker")
+
+
+def test_remote_tally_frames_converge(poll):
+    poll, question_id, (a, b) = poll
+
+    async def main():
+        broker = {}
+        one, two = Worker("one", broker), Worker("two", broker)
+        await one.backplane.start()
+        await two.backplane.start()
+        try:
+            two.load(poll)
+            for n, option_id in enumerate([a, a, b], start=1):
+                await one.vote(poll, question_id, option_id)
+                await _delivered(two, n)
+            await two.vote(poll, question_id, b)
+            await _delivered(one, 1)
+        finally:
+            await one.backplane.stop()
+            await two.backplane.stop()
+        return one.load(poll), two.load(poll)
+
+    first, second = asyncio.run(main())
+    assert first.questions == second.questions == {question_id: 4}
+    assert first.options == second.options == {a: 2, b: 2}
+
+
+@pytest.mark.parametrize("committed_before_read", [False, True])
+def test_frame_during_load_is_not_counted_twice(poll, committed_before_read):
+    poll, question_id, (a, b) = poll
+
+    async def main():
+        broker = {}
+        one, two = Worker("one", broker), Worker("two", broker)
+        await one.backplane.start()
+        await two.backplane.start()
+        loop = asyncio.get_running_loop()
+        # Worker two reads the database either before or after worker one commits a
+        # vote; either way the vote's frame reaches worker two before it installs that read
+        delta = one.commit(poll, question_id, a) if committed_before_read else None
+        install = two.tally._install
+        reads = []
+
+        def racing_install(slug, tally, writes):
+            if not reads:
+                frame = delta or one.commit(poll, question_id, a)
+                asyncio.run_coroutine_threadsafe(one.publish(poll, frame), loop).result()
+                asyncio.run_coroutine_threadsafe(_delivered(two, 1), loop).result()
+            reads.append(tally.questions[question_id])
+            return install(slug, tally, writes)
+
+        two.tally._install = racing_install
+        try:
+            await asyncio.to_thread(two.load, poll)
+        finally:
+            await one.backplane.stop()
+            await two.backplane.stop()
+        return reads, one.load(poll), two.load(poll)
+
+    reads, first, second = asyncio.run(main())
+    # The read the frame raced with is thrown away and the poll read again
+    assert reads == ([1, 1] if committed_before_read else [0, 1])
+    assert first.questions == second.questions == {question_id: 1}
+    assert first.options == second.options == {a: 1, b: 0}
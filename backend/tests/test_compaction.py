@@ -0,0 +1,105 @@
+import json
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app import compaction, database, models
+from app.compaction import archived_votes, iter_answers, pack_answers
+
+AWKWARD = ['', 'plain', 'say "hi"', 'back\\slash', '[1,"x"]', ', ] [', 'naïve', '漢字', '😀 emoji', 'line\nbreak', 'tab\t']
+
+
+def _answers(n: int):
+    return [([None, 3, 41][i % 3], AWKWARD[i % len(AWKWARD)] + str(i)) for i in range(n)]
+
+
+def test_pack_answers_is_plain_compressed_json():
+    answers = _answers(50)
+    assert json.loads(zlib.decompress(pack_answers(answers))) == [list(a) for a in answers]
+    assert pack_answers([]) is None
+    assert pack_answers(iter(answers)) == pack_answers(answers)
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 7, 64, 65536])
+@pytest.mark.parametrize("n", [0, 1, 2, 200])
+def test_iter_answers_round_trips_across_chunk_boundaries(monkeypatch, chunk, n):
+    # Tiny chunks split elements, escapes and multi-byte characters mid-way
+    monkeypatch.setattr(compaction, "INFLATE_CHUNK", chunk)
+    answers = _answers(n)
+    assert list(iter_answers(pack_answers(answers))) == answers
+
+
+def test_iter_answers_reads_blobs_written_in_one_piece():
+    # Archives written before streaming packing: one zlib.compress of the whole list
+    answers = _answers(30)
+    blob = zlib.compress(json.dumps(answers, separators=(",", ":")).encode(), 9)
+    assert list(iter_answers(blob)) == answers
+    assert list(iter_answers(None)) == []
+
+
+def test_iter_answers_rejects_a_corrupt_blob():
+    blob = zlib.compress(b'[[1,"a"],[2,"b"')
+    with pytest.raises(ValueError):
+        list(iter_answers(blob))
+
+
+def test_archived_votes_rebuilds_counts_and_answers():
+    archive = SimpleNamespace(
+        question_id=7,
+        counts=json.dumps([[None, 1], [3, 3], [4, 2]]),
+        answers=pack_answers([(3, "red"), (None, "other")]),
+        last_vote_at=datetime(2025, 1, 2),
+        archived_at=datetime(2025, 2, 1),
+    )
+    # Option 4 was deleted since compaction
+    votes = list(archived_votes(archive, {3}))
+    assert len(votes) == 6
+    assert [(v["option_id"], v["text_answer"]) for v in votes] == [
+        (3, "red"), (None, "other"), (3, None), (3, None), (None, None), (None, None),
+    ]
+    assert {v["id"] for v in votes} == {0}
+    assert {v["created_at"] for v in votes} == {datetime(2025, 1, 2)}
+
+
+def _close_and_vote(poll_id, votes):
+    db = database.SessionLocal()
+    try:
+        db.query(models.Poll).filter(models.Poll.id == poll_id).update({"is_active": False})
+        db.add_all(models.Vote(question_id=question_id, option_id=option_id, text_answer=text) for question_id, option_id, text in votes)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_compact_poll_merges_into_existing_archive(poll):
+    poll, question_id, (a, b) = poll
+    _close_and_vote(poll.id, [(question_id, a, None), (question_id, a, "first"), (question_id, b, None)])
+    db = database.SessionLocal()
+    try:
+        assert compaction.compact_poll(db, poll.id) == 3
+        # Votes that arrive after compaction (the poll was reopened) are added to the archive
+        _close_and_vote(poll.id, [(question_id, b, "second"), (question_id, None, "third")])
+        assert compaction.compact_poll(db, poll.id) == 2
+
+        assert db.query(models.Vote).filter(models.Vote.question_id == question_id).count() == 0
+        archive = db.query(models.QuestionArchive).filter_by(question_id=question_id).one()
+        assert archive.vote_count == 5
+        assert json.loads(archive.counts) == [[None, 1], [a, 2], [b, 2]]
+        assert list(iter_answers(archive.answers)) == [(a, "first"), (b, "second"), (None, "third")]
+        assert compaction.archived_counts(db, [question_id]) == {(question_id, None): 1, (question_id, a): 2, (question_id, b): 2}
+    finally:
+        db.close()
+
+
+def test_compact_poll_skips_an_open_poll(poll):
+    poll, question_id, (a, b) = poll
+    db = database.SessionLocal()
+    try:
+        db.add(models.Vote(question_id=question_id, option_id=a))
+        db.commit()
+        assert compaction.compact_poll(db, poll.id) is None
+        assert db.query(models.Vote).filter(models.Vote.question_id == question_id).count() == 1
+    finally:
+        db.close()
@@ -0,0 +1,117 @@
+"""
+Accept-Encoding negotiation, compression of buffered and streamed responses,
+and conditional GETs against the weak ETags that compressed responses carry.
+"""
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import compression, database, models
+from app.compression import CompressionMiddleware, negotiate
+from app.snapshots import poll_snapshots
+
+
+@pytest.mark.parametrize("header, with_brotli, without_brotli", [
+    ("", None, None),
+    ("gzip", "gzip", "gzip"),
+    ("gzip, deflate, br", "br", "gzip"),
+    ("br;q=0, gzip", "gzip", "gzip"),
+    ("gzip;q=0", None, None),
+    ("GZIP;q=0.5", "gzip", "gzip"),
+    ("gzip;q=nonsense", None, None),
+    ("*", "br", "gzip"),
+    ("*;q=0, gzip", "gzip", "gzip"),
+    ("identity", None, None),
+])
+def test_negotiate(monkeypatch, header, with_brotli, without_brotli):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert negotiate(header) == with_brotli
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate(header) == without_brotli
+
+
+def _app() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("x" * 10)
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse("x" * 5000, headers={"ETag": '"v1"'})
+
+    @app.get("/rows")
+    def rows():
+        return StreamingResponse((f'{{"n":{i}}}\n' for i in range(100)), media_type="application/x-ndjson")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: 1\n\n"] * 100), media_type="text/event-stream")
+
+    app.add_middleware(CompressionMiddleware, min_size=1024)
+    return TestClient(app)
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+
+def test_buffered_responses(gzip_only):
+    client = _app()
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["vary"] == "Accept-Encoding"
+    assert large.headers["etag"] == 'W/"v1"'
+    assert int(large.headers["content-length"]) < 5000
+    assert large.text == "x" * 5000
+    plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["etag"] == '"v1"'
+
+
+def test_streamed_responses(gzip_only):
+    client = _app()
+    with client.stream("GET", "/rows", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw).decode() == "".join(f'{{"n":{i}}}\n' for i in range(100))
+    # Event streams are not a compressible type: each event must go out as written
+    events = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in events.headers
+
+
+def test_conditional_get_matches_weak_etag(client, gzip_only):
+    db = database.SessionLocal()
+    try:
+        poll = models.Poll(title="Compressed")
+        # Enough questions that the snapshot is over the compression threshold
+        poll.questions = [models.Question(text=f"Question {i} " * 10, question_type=models.QuestionType.OPEN_ENDED) for i in range(10)]
+        db.add(poll)
+        db.commit()
+        slug = poll.slug
+    finally:
+        db.close()
+
+    first = client.get(f"/polls/{slug}", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.json()["slug"] == slug
+
+    for if_none_match in (etag, etag.removeprefix("W/"), f'"other", {etag}'):
+        response = client.get(f"/polls/{slug}", headers={"Accept-Encoding": "gzip", "If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    poll_snapshots.bump(slug)
+    changed = client.get(f"/polls/{slug}", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
@@ -0,0 +1,85 @@
+import asyncio
+
+from app.dedup import RecentIds, dedup_key
+
+
+def test_dedup_key_is_scoped_to_the_participant():
+    assert dedup_key(None, "p1") is None
+    assert dedup_key("v1", None) == "v1"
+    assert dedup_key("v1", "p1") == "p1:v1"
+
+
+def test_confirmed_key_is_a_duplicate_and_forgotten_key_is_not():
+    async def main():
+        ids = RecentIds(window=600, max_ids=100)
+        assert await ids.claim("a")
+        ids.confirm("a")
+        assert not await ids.claim("a")
+        ids.forget("a")
+        assert await ids.claim("a")
+        return ids
+
+    ids = asyncio.run(main())
+    assert ids.stats["duplicates"] == 1
+
+
+def test_retry_waits_for_the_first_attempt():
+    async def main(first_stored: bool):
+        ids = RecentIds(window=600, max_ids=100)
+        assert await ids.claim("a")
+        retry = asyncio.create_task(ids.claim("a"))
+        await asyncio.sleep(0.01)
+        # Not answered while the first attempt is still writing
+        assert not retry.done()
+        if first_stored:
+            ids.confirm("a")
+        else:
+            ids.forget("a")
+        return await retry, ids
+
+    duplicate, ids = asyncio.run(main(first_stored=True))
+    assert duplicate is False and ids.stats["waited"] == 1
+    # The first write failed: the retry gets to store the vote
+    claimed, ids = asyncio.run(main(first_stored=False))
+    assert claimed is True and ids.snapshot_stats()["in_flight"] == 1
+
+
+async def _store(ids: RecentIds, *keys: str):
+    for key in keys:
+        assert await ids.claim(key)
+        ids.confirm(key)
+
+
+def test_full_generation_rotates_and_the_previous_one_still_counts():
+    async def main():
+        ids = RecentIds(window=600, max_ids=2)
+        await _store(ids, "a", "b")
+        # The current generation is full: "c" starts a new one, "a" and "b" move to previous
+        await _store(ids, "c")
+        assert ids.stats["rotations"] == 1
+        assert not await ids.claim("a")
+        await _store(ids, "d")
+        # Second rotation: "a" and "b" age out, "c" and "d" are still remembered
+        await _store(ids, "e")
+        assert ids.stats["rotations"] == 2
+        assert await ids.claim("a")
+        assert not await ids.claim("c")
+        ids.forget("d")
+        assert await ids.claim("d")
+        return ids
+
+    stats = asyncio.run(main()).snapshot_stats()
+    # "c" and "e" are remembered; "a" and "d" are claimed again and still writing
+    assert (stats["size"], stats["in_flight"]) == (2, 2)
+
+
+def test_generation_rotates_when_the_window_passes():
+    async def main():
+        ids = RecentIds(window=0, max_ids=100)
+        await _store(ids, "a", "b", "c")
+        # Every confirm rotates: only the latest two generations are kept
+        assert [await ids.claim(key) for key in ("a", "b", "c")] == [True, False, False]
+        return ids
+
+    ids = asyncio.run(main())
+    assert ids.stats["rotations"] == 3
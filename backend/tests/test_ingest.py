@@ -0,0 +1,154 @@
+"""
+Write-behind ingestion: votes acknowledged but not yet written must show up in
+the tally exactly once, before and after their batch is committed, and a batch
+that cannot be written must not leave counts or dedup keys behind.
+"""
+import asyncio
+
+from app import database, ingest, models, vote_counts
+from app.dedup import recent_votes
+from app.ingest import VoteWriter
+from app.tally import TallyCache, tally_cache
+
+
+def _load(cache: TallyCache, poll):
+    db = database.SessionLocal()
+    try:
+        return cache.get(poll.slug, poll, db)
+    finally:
+        db.close()
+
+
+def _write_votes(question_id: int, option_id: int, n: int):
+    db = database.SessionLocal()
+    try:
+        db.add_all(models.Vote(question_id=question_id, option_id=option_id) for _ in range(n))
+        vote_counts.add_votes(db, {(question_id, option_id): n})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _stored(question_id: int) -> int:
+    db = database.SessionLocal()
+    try:
+        return db.query(models.Vote).filter(models.Vote.question_id == question_id).count()
+    finally:
+        db.close()
+
+
+def test_pending_votes_are_counted_once_across_a_flush(poll):
+    poll, question_id, (a, b) = poll
+    cache = TallyCache()
+    cache.add_pending(poll.slug, question_id, a)
+    cache.add_pending(poll.slug, question_id, a)
+    tally = _load(cache, poll)
+    assert tally.options[a] == 2
+    version = tally.version
+
+    cache.begin_flush([poll.slug])
+    _write_votes(question_id, a, 2)
+    cache.end_flush([poll.slug], [(poll.slug, question_id, a, None)] * 2)
+    cache.invalidate(poll.slug)
+    rebuilt = _load(cache, poll)
+    assert rebuilt.options[a] == 2
+    assert rebuilt.questions[question_id] == 2
+    # The rebuilt tally continues the version sequence clients already hold
+    assert rebuilt.version == version + 1
+
+
+def test_rebuild_during_a_flush_is_not_installed(poll):
+    poll, question_id, (a, b) = poll
+    cache = TallyCache()
+    cache.add_pending(poll.slug, question_id, b)
+    cache.begin_flush([poll.slug])
+    _write_votes(question_id, b, 1)
+    # Read after the commit but before end_flush: the vote is both stored and pending
+    during = _load(cache, poll)
+    assert cache._tallies.get(poll.slug) is not during
+    cache.end_flush([poll.slug], [(poll.slug, question_id, b, None)])
+    assert _load(cache, poll).options[b] == 1
+
+
+def test_failed_flush_keeps_votes_pending(poll):
+    poll, question_id, (a, b) = poll
+    cache = TallyCache()
+    cache.add_pending(poll.slug, question_id, a)
+    cache.begin_flush([poll.slug])
+    cache.end_flush([poll.slug])
+    assert _load(cache, poll).options[a] == 1
+
+
+def test_failed_write_is_retried(poll, monkeypatch):
+    poll, question_id, (a, b) = poll
+    writer = VoteWriter(batch_ms=1)
+    write = writer._write
+    calls = []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        write(batch)
+
+    monkeypatch.setattr(writer, "_write", flaky)
+
+    async def main():
+        await writer.start()
+        assert writer.submit(poll.slug, question_id, a, None)
+        await writer.stop()
+
+    asyncio.run(main())
+    assert calls == [1, 1]
+    assert writer.stats["written"] == 1
+    assert writer.stats["failed"] == 0
+    assert _stored(question_id) == 1
+
+
+def test_abandoned_batch_releases_its_votes(poll, monkeypatch):
+    poll, question_id, (a, b) = poll
+    monkeypatch.setattr(ingest, "VOTE_WRITE_RETRIES", 2)
+    writer = VoteWriter(batch_ms=1)
+
+    def broken(batch):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(writer, "_write", broken)
+    key = f"{poll.slug}:abandoned"
+
+    async def main():
+        await writer.start()
+        tally = _load(tally_cache, poll)
+        assert await recent_votes.claim(key)
+        assert writer.submit(poll.slug, question_id, b, None, key)
+        tally_cache.record_vote(poll.slug, tally, question_id, b)
+        await writer.stop()
+        assert not tally.loaded
+        # The client's retry is let through rather than answered as a duplicate
+        assert await recent_votes.claim(key)
+        recent_votes.forget(key)
+
+    asyncio.run(main())
+    assert writer.stats["failed"] == 1
+    assert writer.stats["written"] == 0
+    assert poll.slug not in tally_cache._pending
+    assert _load(tally_cache, poll).options[b] == 0
+
+
+def test_stop_flushes_the_batch_being_collected(poll):
+    poll, question_id, (a, b) = poll
+    # A window far longer than the test: only stop can end the batch
+    writer = VoteWriter(batch_ms=60_000)
+
+    async def main():
+        await writer.start()
+        for _ in range(3):
+            assert writer.submit(poll.slug, question_id, a, None)
+        await asyncio.sleep(0.01)
+        await writer.stop()
+
+    asyncio.run(main())
+    assert writer.stats["written"] == 3
+    assert writer.stats["batches"] == 1
+    assert _stored(question_id) == 3
+    assert poll.slug not in tally_cache._pending
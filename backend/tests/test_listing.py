@@ -0,0 +1,54 @@
+"""
+GET /polls/ pages through polls newest first with an opaque (created_at, id)
+cursor; polls created in the same instant must neither repeat nor go missing.
+"""
+from datetime import datetime
+
+import pytest
+
+from app import database, models
+
+OWNER = 9001
+
+
+@pytest.fixture
+def polls():
+    db = database.SessionLocal()
+    try:
+        # Three polls share each timestamp, the way a seeded or imported batch does
+        stamps = [datetime(2025, 3, 1, 12, 0, 0), datetime(2025, 3, 1, 12, 0, 0, 500), datetime(2025, 3, 2)]
+        rows = [models.Poll(title=f"p{i}", owner_id=OWNER, created_at=stamps[i % 3]) for i in range(9)]
+        db.add_all(rows)
+        db.commit()
+        # Newest first, ties broken by id
+        expected = [p.id for p in sorted(rows, key=lambda p: (p.created_at, p.id), reverse=True)]
+        yield expected
+    finally:
+        db.query(models.Poll).filter(models.Poll.owner_id == OWNER).delete()
+        db.commit()
+        db.close()
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4, 9, 50])
+def test_cursor_walks_every_poll_once(client, polls, limit):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"owner_id": OWNER, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/polls/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= limit
+        seen += [p["id"] for p in page]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == polls
+    assert pages == -(-len(polls) // limit)
+
+
+def test_bad_cursor_is_rejected(client):
+    response = client.get("/polls/", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
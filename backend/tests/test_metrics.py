@@ -0,0 +1,28 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.metrics import MetricsMiddleware, http_request_duration
+
+
+def test_streams_are_timed_to_their_first_chunk():
+    app = FastAPI()
+
+    @app.get("/stream")
+    async def stream():
+        async def events():
+            for i in range(3):
+                yield f"data: {i}\n\n"
+                await asyncio.sleep(0.1)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.add_middleware(MetricsMiddleware)
+    response = TestClient(app).get("/stream")
+    assert response.text.count("data:") == 3
+    counts, total = http_request_duration._values[("GET", "/stream", "200")]
+    assert sum(counts) == 1
+    # The stream stayed open for 0.3s; only the time to its first event is recorded
+    assert total < 0.1
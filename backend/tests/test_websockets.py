@@ -0,0 +1,83 @@
+import asyncio
+
+from app import websockets
+from app.websockets import BroadcastScheduler, ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        if self.fail:
+            raise ConnectionResetError("peer gone")
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def test_failed_send_closes_the_socket():
+    async def main():
+        manager = ConnectionManager(ping_interval=0)
+        socket = FakeSocket(fail=True)
+        connection = await manager.connect(socket, "p1")
+        connection.send_json({"event": "tally"})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return manager, socket
+
+    manager, socket = asyncio.run(main())
+    assert manager.count == 0 and manager.stats["send_failures"] == 1
+    # The endpoint's receive loop only ends once the socket is closed
+    assert socket.closed_with == 1011
+
+
+def test_send_timeout_closes_the_socket(monkeypatch):
+    monkeypatch.setattr(websockets, "SEND_TIMEOUT", 0.01)
+
+    class StalledSocket(FakeSocket):
+        async def send_text(self, data: str):
+            await asyncio.sleep(1)
+
+    async def main():
+        manager = ConnectionManager(ping_interval=0)
+        socket = StalledSocket()
+        connection = await manager.connect(socket, "p1")
+        connection.send_json({"event": "tally"})
+        await asyncio.sleep(0.1)
+        return manager, socket
+
+    manager, socket = asyncio.run(main())
+    assert manager.count == 0
+    assert socket.closed_with == 1011
+
+
+def test_flush_all_keeps_frames_published_while_it_runs():
+    async def main():
+        scheduler = BroadcastScheduler(ConnectionManager(ping_interval=0), window_ms=10)
+        delivered = []
+
+        async def deliver(frame, slug):
+            delivered.append(frame["n"])
+            if frame["n"] == 1:
+                # A vote lands while shutdown is flushing: it gets a new timer
+                await scheduler.publish({"event": "other", "n": 2}, slug)
+            await asyncio.sleep(0)
+
+        scheduler.deliver = deliver
+        await scheduler.publish({"event": "other", "n": 1}, "s")
+        # Let the timer start waiting, so cancelling it runs its cleanup
+        await asyncio.sleep(0)
+        await scheduler.flush_all()
+        await asyncio.sleep(0.05)
+        return delivered, scheduler
+
+    delivered, scheduler = asyncio.run(main())
+    assert delivered == [1, 2]
+    assert scheduler.snapshot_stats()["pending_slugs"] == 0
@@ -0,0 +1,47 @@
+import random
+
+from app.wordfreq import HeavyHitters, tokenize
+
+
+def _reference(stream, capacity):
+    """Space-Saving with a linear minimum scan, evicting the lowest (count, term)."""
+    counters = {}
+    for term in stream:
+        if term in counters:
+            counters[term][0] += 1
+        elif len(counters) < capacity:
+            counters[term] = [1, 0]
+        else:
+            victim = min(counters, key=lambda t: (counters[t][0], t))
+            floor = counters.pop(victim)[0]
+            counters[term] = [floor + 1, floor]
+    return counters
+
+
+def test_matches_the_linear_scan():
+    rng = random.Random(7)
+    # Zipf-ish: a few frequent words and a long tail of rare ones
+    vocabulary = [f"w{i}" for i in range(500)]
+    weights = [1 / (i + 1) for i in range(500)]
+    stream = rng.choices(vocabulary, weights, k=20000)
+    hitters = HeavyHitters(capacity=40)
+    for term in stream:
+        hitters.add(term)
+    assert hitters.counters == _reference(stream, 40)
+    assert len(hitters.counters) == 40
+    # Stale heap entries are dropped before they outgrow the table
+    assert len(hitters._heap) < 4 * 40
+    assert [term for term, _ in hitters.top(3)] == ["w0", "w1", "w2"]
+
+
+def test_top_follows_new_counts():
+    hitters = HeavyHitters(capacity=10)
+    hitters.add_text("blue green blue")
+    assert hitters.top(2) == [("blue", 2), ("green", 1)]
+    hitters.add("green", 5)
+    assert hitters.top(2) == [("green", 6), ("blue", 2)]
+    assert hitters.top(1) == [("green", 6)]
+
+
+def test_tokenize_drops_stopwords_and_numbers():
+    assert tokenize("The 'Cloud' is GREAT, 42 x it's") == ["cloud", "great"]
@@ -7,7 +7,8 @@ import Header from './Header';
 
 
 function AdminDashboard() {
-    const [polls, setPolls] = useState([]);
+    // One page list per tab; cursor is the X-Next-Cursor of the last page (null when done)
+    const [pages, setPages] = useState({ active: { polls: [], cursor: null }, closed: { polls: [], cursor: null } });
     const [loading, setLoading] = useState(true);
     const [modalConfig, setModalConfig] = useState({ isOpen: false, type: null, slug: null });
     const [copiedId, setCopiedId] = useState(null);
@@ -88,10 +89,15 @@ function AdminDashboard() {
         fetchPolls();
     }, []);
 
+    const fetchPage = (status, cursor) => api.get('/polls/', { params: { status, cursor, t: Date.now() } });
+
     const fetchPolls = async () => {
         try {
-            const response = await api.get(`/polls/?t=${Date.now()}`);
-            setPolls(response.data);
+            const [active, closed] = await Promise.all([fetchPage('active'), fetchPage('closed')]);
+            setPages({
+                active: { polls: active.data, cursor: active.headers['x-next-cursor'] || null },
+                closed: { polls: closed.data, cursor: closed.headers['x-next-cursor'] || null },
+            });
         } catch (error) {
             console.error("Failed to fetch polls", error);
             if (error.response && error.response.status === 401) {
@@ -106,8 +112,24 @@ function AdminDashboard() {
 
 
 
-    const activePolls = polls.filter(p => p.is_active);
-    const archivedPolls = polls.filter(p => !p.is_active);
+    const loadMore = async (status) => {
+        try {
+            const response = await fetchPage(status, pages[status].cursor);
+            setPages(prev => ({
+                ...prev,
+                [status]: {
+                    polls: [...prev[status].polls, ...response.data],
+                    cursor: response.headers['x-next-cursor'] || null,
+                },
+            }));
+        } catch (error) {
+            console.error("Failed to fetch polls", error);
+        }
+    };
+
+    const activePolls = pages.active.polls;
+    const archivedPolls = pages.closed.polls;
+    const polls = [...activePolls, ...archivedPolls];
 
     if (loading) return <div className="p-8 text-center">Loading...</div>;
 
@@ -167,6 +189,7 @@ function AdminDashboard() {
                                     active
                                     onCopy={handleCopy}
                                     copiedId={copiedId}
+                                    onLoadMore={pages.active.cursor ? () => loadMore('active') : null}
                                 />
                             </div>
                         ) : (
@@ -178,6 +201,7 @@ function AdminDashboard() {
                                     onDelete={confirmDelete}
                                     onCopy={handleCopy}
                                     copiedId={copiedId}
+                                    onLoadMore={pages.closed.cursor ? () => loadMore('closed') : null}
                                 />
                             </div>
                         )}
@@ -208,7 +232,7 @@ function AdminDashboard() {
     );
 }
 
-function Section({ title, polls, onClose, onDelete, active, onCopy, copiedId }) {
+function Section({ title, polls, onClose, onDelete, active, onCopy, copiedId, onLoadMore }) {
     if (polls.length === 0) return (
         <div className="text-gray-400 italic p-6 bg-white rounded-lg border border-gray-200">No polls found in this section.</div>
     );
@@ -235,7 +259,7 @@ function Section({ title, polls, onClose, onDelete, active, onCopy, copiedId })
                                     >
                                         {poll.title}
                                     </Link>
-                                    <div className="text-gray-500 text-sm mt-1">{poll.questions.length} Questions</div>
+                                    <div className="text-gray-500 text-sm mt-1">{poll.question_count} Questions · {poll.total_votes} Votes</div>
                                 </td>
                                 <td className="px-6 py-4 text-gray-500 text-sm">
                                     {new Date(poll.created_at).toLocaleDateString()}
@@ -277,6 +301,14 @@ function Section({ title, polls, onClose, onDelete, active, onCopy, copiedId })
                     </tbody>
                 </table>
             </div>
+            {onLoadMore && (
+                <button
+                    onClick={onLoadMore}
+                    className="w-full mt-3 py-2 text-sm font-bold text-gray-500 hover:text-primary transition-colors"
+                >
+                    Load more
+                </button>
+            )}
         </section>
     )
 }
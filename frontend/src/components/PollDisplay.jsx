@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useMemo, useRef, useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { QRCodeSVG } from 'qrcode.react';
 import api from '../api';
@@ -40,6 +40,17 @@ function PollDisplay() {
     const [poll, setPoll] = useState(null);
     const [singleViewMode, setSingleViewMode] = useState(false);
 
+    // Live tally pushed over the event stream:
+    // { version, questions: {id: total}, options: {id: count}, terms: {questionId: [[term, count], ...]} }
+    // Mirrored in a ref so the stream handlers always compare against the latest version.
+    const [tally, setTally] = useState(null);
+    const tallyRef = useRef(null);
+
+    const applyTally = (next) => {
+        tallyRef.current = next;
+        setTally(next);
+    };
+
     // Auto-refresh timer reference
     useEffect(() => {
         if (poll) {
@@ -48,49 +59,102 @@ function PollDisplay() {
     }, [poll]);
 
     useEffect(() => {
-        let ws;
+        // Read-only display: Server-Sent Events rather than a WebSocket. The browser
+        // reconnects by itself and sends Last-Event-ID, so only missed deltas are replayed.
+        let source;
         let retryCount = 0;
         let isAlive = true;
+        let resyncPending = false;
+        let lastEventId = null;
+        // Reopens a stream the server has gone quiet on (no ping within two intervals)
+        let watchdog;
+
+        const resetWatchdog = (intervalSeconds) => {
+            clearTimeout(watchdog);
+            if (!intervalSeconds) return;
+            watchdog = setTimeout(() => {
+                console.log("[SSE] No heartbeat from server. Reconnecting...");
+                source.close();
+                connect();
+            }, intervalSeconds * 2000);
+        };
+
+        // Full counts over HTTP, when a delta does not follow the version we have
+        const requestResync = async () => {
+            if (resyncPending) return;
+            resyncPending = true;
+            try {
+                const res = await api.get(`/polls/${slug}/results`);
+                const current = tallyRef.current;
+                if (isAlive && (!current || res.data.version >= current.version)) {
+                    applyTally({ version: res.data.version, questions: res.data.questions, options: res.data.options, terms: res.data.terms || {} });
+                }
+            } catch (err) {
+                console.error(err);
+            } finally {
+                resyncPending = false;
+            }
+        };
 
         const connect = () => {
             if (!isAlive) return;
 
-            // DYNAMIC PROTOCOL & HOST (Critical for Mixed Content Fix)
-            const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            // Use window.location.host to respect the Proxy Port (443 or whatever URL calls it)
-            const wsUrl = `${protocol}//${window.location.host}/ws/${slug}`;
+            // A stream reopened by hand resumes through the query parameter
+            const resume = lastEventId ? `?last_event_id=${encodeURIComponent(lastEventId)}` : '';
+            const streamUrl = `${api.defaults.baseURL}/polls/${slug}/stream${resume}`;
 
-            console.log(`[WS] Connecting to ${wsUrl}...`);
-            ws = new WebSocket(wsUrl);
+            console.log(`[SSE] Connecting to ${streamUrl}...`);
+            source = new EventSource(streamUrl);
 
-            ws.onopen = () => {
-                console.log("[WS] Connected");
+            source.onopen = () => {
+                console.log("[SSE] Connected");
                 retryCount = 0;
             };
 
-            ws.onmessage = (event) => {
+            source.onmessage = (event) => {
+                if (event.lastEventId) lastEventId = event.lastEventId;
                 const data = JSON.parse(event.data);
-                console.log("[WS] Message:", data);
-                if (data.event === "update") {
-                    console.log("[WS] Update received! Fetching poll...");
+                if (data.event === "ping") {
+                    resetWatchdog(data.interval);
+                } else if (data.event === "snapshot") {
+                    applyTally({ version: data.version, questions: data.questions, options: data.options, terms: data.terms || {} });
+                } else if (data.event === "tally") {
+                    const current = tallyRef.current;
+                    // Waiting for a snapshot, or a frame we already have
+                    if (!current || data.version <= current.version) return;
+                    if (data.base !== current.version) {
+                        console.log(`[SSE] Version gap (have ${current.version}, frame base ${data.base}). Resyncing...`);
+                        requestResync();
+                        return;
+                    }
+                    applyTally({
+                        version: data.version,
+                        questions: { ...current.questions, ...data.questions },
+                        options: { ...current.options, ...data.options },
+                        terms: { ...current.terms, ...(data.terms || {}) },
+                    });
+                } else if (data.event === "update") {
+                    console.log("[SSE] Poll changed. Fetching poll...");
                     fetchPoll();
+                    requestResync();
                 }
             };
 
-            ws.onclose = () => {
-                console.log("[WS] Disconnected");
+            source.onerror = () => {
+                // Still CONNECTING: the browser is retrying on its own. CLOSED: it gave up
+                // (e.g. 503 at the connection cap), so retry with backoff.
+                if (source.readyState !== EventSource.CLOSED) {
+                    console.log("[SSE] Connection lost. Browser is reconnecting...");
+                    return;
+                }
+                clearTimeout(watchdog);
                 if (isAlive) {
                     const timeout = Math.min(5000, 1000 * Math.pow(2, retryCount));
                     retryCount++;
-                    console.log(`[WS] Reconnecting in ${timeout}ms...`);
+                    console.log(`[SSE] Reconnecting in ${timeout}ms...`);
                     setTimeout(connect, timeout);
                 }
             };
-
-            ws.onerror = (err) => {
-                console.error("[WS] Error:", err);
-                ws.close();
-            };
         };
 
         fetchPoll();
@@ -98,14 +162,15 @@ function PollDisplay() {
 
         return () => {
             isAlive = false;
-            if (ws) ws.close();
+            clearTimeout(watchdog);
+            if (source) source.close();
         };
     }, [slug]);
 
     const fetchPoll = async () => {
         try {
-            // Timestamp to prevent caching
-            const res = await api.get(`/polls/${slug}?t=${Date.now()}`);
+            // The API sends an ETag; the browser revalidates and gets a 304 when nothing changed
+            const res = await api.get(`/polls/${slug}`);
             console.log("Poll Data:", res.data);
 
             if (!res.data || typeof res.data !== 'object') {
@@ -120,6 +185,23 @@ function PollDisplay() {
         }
     };
 
+    // Poll structure with the live counts and word-cloud terms merged in
+    const livePoll = useMemo(() => {
+        if (!poll || poll.error || !tally) return poll;
+        return {
+            ...poll,
+            questions: poll.questions.map(q => {
+                const merged = { ...q };
+                if (tally.questions[q.id] !== undefined) merged.vote_count = tally.questions[q.id];
+                if (tally.terms[q.id]) merged.terms = tally.terms[q.id];
+                merged.options = q.options.map(o => (
+                    tally.options[o.id] !== undefined ? { ...o, vote_count: tally.options[o.id] } : o
+                ));
+                return merged;
+            }),
+        };
+    }, [poll, tally]);
+
     // URL Construction for QR
     const joinUrl = `${window.location.protocol}//${window.location.host}`;
 
@@ -169,7 +251,7 @@ function PollDisplay() {
             {/* Main Content Area - Full Screen Player */}
             <div className="flex-grow w-full relative overflow-hidden">
                 <ErrorBoundary>
-                    <PollPlayer poll={poll} controlsBehavior="autohide" />
+                    <PollPlayer poll={livePoll} controlsBehavior="autohide" />
                 </ErrorBoundary>
             </div>
 
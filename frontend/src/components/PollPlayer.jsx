@@ -28,6 +28,12 @@ const darkenColorForText = (hex) => {
     return hex;
 };
 
+// Live displays merge tally counts into `vote_count`; previews still carry the raw vote lists
+const getVoteCount = (item) => {
+    if (item.vote_count !== undefined) return item.vote_count;
+    return item.votes ? item.votes.length : 0;
+};
+
 const getSmartAxisWidth = (data, key = 'name') => {
     if (!data || data.length === 0) return 40;
     const maxLen = Math.max(...data.map(d => (d[key] || '').toString().length));
@@ -73,7 +79,7 @@ const PollVisualizer = ({ question, colors, isPreview }) => {
     const data = useMemo(() => {
         return question.options.map(opt => ({
             name: opt.text,
-            votes: opt.votes ? opt.votes.length : 0
+            votes: getVoteCount(opt)
         }));
     }, [question.options]);
 
@@ -85,7 +91,10 @@ const PollVisualizer = ({ question, colors, isPreview }) => {
     // --- RENDER LOGIC ---
     if (visType === 'wordcloud') {
         let cloudData = [];
-        if (question.question_type === 'open_ended') {
+        if (question.question_type === 'open_ended' && question.terms) {
+            // Live displays: top terms counted on the server
+            cloudData = question.terms.map(([text, value]) => ({ text, value }));
+        } else if (question.question_type === 'open_ended') {
             const freqMap = {};
             if (question.votes) {
                 question.votes.forEach(v => {
@@ -451,7 +460,7 @@ function PollPlayer({ poll, activePalette, enableTitlePage, isPreview = false, c
 
     // Derived Values
     const totalVotes = questions.reduce((sum, q) => {
-        const qVotes = q.options ? q.options.reduce((acc, o) => acc + (o.votes ? o.votes.length : 0), 0) : 0;
+        const qVotes = q.options ? q.options.reduce((acc, o) => acc + getVoteCount(o), 0) : 0;
         return sum + qVotes;
     }, 0);
 
@@ -459,9 +468,9 @@ function PollPlayer({ poll, activePalette, enableTitlePage, isPreview = false, c
     // We only want to re-render visualization if this signature changes.
     const visSignature = useMemo(() => {
         if (!question) return 'none';
-        const voteSig = question.options.map(o => o.votes ? o.votes.length : 0).join(',');
+        const voteSig = question.options.map(o => getVoteCount(o)).join(',');
         const textSig = question.text + question.options.map(o => o.text).join('');
-        return `${question.id}-${voteSig}-${textSig}-${isPreview}`;
+        return `${question.id}-${getVoteCount(question)}-${voteSig}-${textSig}-${isPreview}`;
     }, [question, isPreview]);
 
     // MEMOIZED VISUALIZER ELEMENT
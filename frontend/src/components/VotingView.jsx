@@ -4,12 +4,29 @@ import { ArrowRight, CheckCircle } from 'lucide-react';
 import api from '../api';
 import VotingPlayer from './VotingPlayer';
 
+// crypto.randomUUID is only available on secure origins
+const newId = () => (window.crypto && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+
+// Stable per browser, so vote ids only have to be unique per participant
+const getParticipantId = () => {
+    let id = localStorage.getItem('qp_participant');
+    if (!id) {
+        id = newId();
+        localStorage.setItem('qp_participant', id);
+    }
+    return id;
+};
+
 function VotingView() {
     const { slug } = useParams();
     const [poll, setPoll] = useState(null);
     const [isSubmitting, setIsSubmitting] = useState(false);
     const [isFinished, setIsFinished] = useState(false);
     const [error, setError] = useState(null);
+    // One id per visit: resubmitting after a failure reuses it, so a ballot that did get through is not counted twice
+    const [submissionId] = useState(newId);
 
     useEffect(() => {
         document.title = 'Quick Poll Live: Vote';
@@ -42,18 +59,19 @@ function VotingView() {
     const handlePlayerSubmit = async (answers) => {
         setIsSubmitting(true);
         try {
-            // Send votes in parallel
-            const votePromises = Object.keys(answers).map(qId => {
-                const ans = answers[qId];
-                const payload = {
-                    question_id: parseInt(qId),
-                    [ans.isText ? 'text_answer' : 'option_id']: ans.value
-                };
-                return api.post(`/polls/${slug}/vote`, payload);
+            // All answers in one request; the ballot id makes a resubmit safe
+            await api.post(`/polls/${slug}/ballot`, {
+                answers: Object.keys(answers).map(qId => {
+                    const ans = answers[qId];
+                    return {
+                        question_id: parseInt(qId),
+                        [ans.isText ? 'text_answer' : 'option_id']: ans.value
+                    };
+                }),
+                ballot_id: submissionId,
+                participant_id: getParticipantId()
             });
 
-            await Promise.all(votePromises);
-
             // SECURITY: Set LocalStorage Flag (Obfuscated)
             localStorage.setItem(`qp_x_sess_${poll.id}`, Date.now().toString());
 